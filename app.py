@@ -1,19 +1,25 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
 import pandas as pd
 import os
+import io
 import tempfile
-import csv
-import time
+import collections
 import zipfile
-import shutil
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_LEFT
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus.flowables import Flowable
+import hashlib
+import math
+import multiprocessing
+import concurrent.futures
+import threading
+import contextlib
+import re
+import json
+from pdf_builders import (
+    DocumentTask, _create_document_pdf, _get_registered_font, _init_worker, _read_document_rows,
+    _render_png_page, _render_png_pages, _unicode_fallback_fonts,
+    create_authored_quotes_pdf_from_rows, create_pdf_from_rows, create_quotes_pdf_from_rows,
+)
 
 # PDF to PNG conversion imports
 try:
@@ -28,1057 +34,370 @@ try:
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
 
-# Configure Streamlit page
-st.set_page_config(
-    page_title="CSVibe - Dictionary Generator",
-    page_icon="📄",
-    layout="wide"
-)
-
-
-# Line flowable for horizontal lines
-class LineFlowable(Flowable):
-    def __init__(self, width, color=(0, 0, 0), height=6, line_width=4):
-        Flowable.__init__(self)
-        self.width = width
-        self.height = height
-        self.color = color
-        self.line_width = line_width
-
-    def draw(self):
-        from reportlab.lib.colors import Color
-        self.canv.setLineWidth(self.line_width)
-        self.canv.setStrokeColor(Color(*self.color))
-        self.canv.line(0, 0, self.width, 0)
-
-# PDF Generation Function
-def create_pdf_from_csv(csv_file, output_file, 
-                        term_font=None, term_size=84, term_spacing=48,
-                        pronunciation_font=None, pronunciation_size=28, pronunciation_spacing=36,
-                        definition_font=None, definition_size=28, page_color="#FFFFFF",
-                        term_color="#000000", pronunciation_color="#000000", line_color="#000000", definition_color="#000000",
-                        page_width_inches=11, page_height_inches=14, text_alignment="left", page_position="bottom-left"):
-    """Create PDF with customizable fonts and sizes"""
-    
-    def register_font_safe(font_path, base_name):
-        """Safely register a font with unique name to avoid conflicts"""
-        if font_path and font_path.endswith('.ttf') and os.path.exists(font_path):
-            try:
-                # Use timestamp to create unique font name
-                unique_name = f"{base_name}_{int(time.time() * 1000)}"
-                pdfmetrics.registerFont(TTFont(unique_name, font_path))
-                return unique_name
-            except Exception as e:
-                st.warning(f"Failed to register {font_path}: {e}")
-                return 'Times-Bold'
-        elif font_path in ['Times-Bold', 'Helvetica-Bold', 'Helvetica', 'Times-Roman', 'Courier', 'Courier-Bold']:
-            return font_path
-        else:
-            return 'Times-Bold'
-    
-    # Register fonts with unique names
-    title_font = register_font_safe(term_font, 'TermFont')
-    pronunciation_font_name = register_font_safe(pronunciation_font, 'PronunciationFont')
-    definition_font_name = register_font_safe(definition_font, 'DefinitionFont')
-    
-    # Enhanced Unicode support for built-in fonts
-    unicode_font = 'Helvetica'
-    unicode_font_bold = 'Helvetica-Bold'
-    
-    if pronunciation_font_name in ['Helvetica-Bold', 'Helvetica'] or definition_font_name in ['Helvetica-Bold', 'Helvetica']:
-        try:
-            font_configs = [
-                ('C:/Windows/Fonts/segoeui.ttf', 'C:/Windows/Fonts/segoeuib.ttf'),
-                ('/mnt/c/Windows/Fonts/segoeui.ttf', '/mnt/c/Windows/Fonts/segoeuib.ttf'),
-            ]
-            
-            for regular_path, bold_path in font_configs:
-                if os.path.exists(regular_path):
-                    try:
-                        unicode_name = f"Unicode_{int(time.time() * 1000)}"
-                        unicode_bold_name = f"UnicodeBold_{int(time.time() * 1000)}"
-                        
-                        pdfmetrics.registerFont(TTFont(unicode_name, regular_path))
-                        unicode_font = unicode_name
-                        
-                        if os.path.exists(bold_path):
-                            pdfmetrics.registerFont(TTFont(unicode_bold_name, bold_path))
-                            unicode_font_bold = unicode_bold_name
-                        
-                        break
-                    except Exception:
-                        continue
-        except Exception:
-            pass
-    
-    # Update built-in font references to Unicode versions
-    if pronunciation_font_name == 'Helvetica-Bold':
-        pronunciation_font_name = unicode_font_bold
-    elif pronunciation_font_name == 'Helvetica':
-        pronunciation_font_name = unicode_font
-    
-    if definition_font_name == 'Helvetica-Bold':
-        definition_font_name = unicode_font_bold
-    elif definition_font_name == 'Helvetica':
-        definition_font_name = unicode_font
-    
-    # Page setup
-    page_width = page_width_inches * inch
-    page_height = page_height_inches * inch
-    page_size = (page_width, page_height)
-    
-    # Calculate scaling factors based on 11x14 baseline
-    baseline_width = 11.0
-    baseline_height = 14.0
-    width_scale = page_width_inches / baseline_width
-    height_scale = page_height_inches / baseline_height
-    # Use average scale for consistent proportions
-    scale_factor = (width_scale + height_scale) / 2
-    
-    # Scale all size and spacing values
-    scaled_term_size = int(term_size * scale_factor)
-    scaled_term_spacing = int(term_spacing * scale_factor)
-    scaled_pronunciation_size = int(pronunciation_size * scale_factor)
-    scaled_pronunciation_spacing = int(pronunciation_spacing * scale_factor)
-    scaled_definition_size = int(definition_size * scale_factor)
-    
-    # Scale margins proportionally
-    scaled_margin = 1.5 * scale_factor * inch
-    
-    # Scale line width and positioning
-    scaled_line_width = int(4 * scale_factor)
-    scaled_line_length = page_width - 2*scaled_margin  # Match frame content width
-    scaled_definition_space_before = int(54 * scale_factor)
-    
-    # Content-aware positioning functions
-    def calculate_content_height(row, title_style, pronunciation_style, definition_style, available_width):
-        """Calculate the total height needed for all content elements"""
-        try:
-            # Create temporary paragraphs to measure their height
-            term_para = Paragraph(row['term'].lower(), title_style)
-            pronunciation_text = f"{row['pronunciation']} • ({row['type']})"
-            pronunciation_para = Paragraph(pronunciation_text, pronunciation_style)
-            definition_para = Paragraph(row['definition'], definition_style)
-            
-            # Measure actual heights using ReportLab's wrap method
-            # Use a reasonable max height to force proper wrapping calculation
-            max_height = 20 * inch  # Large enough to not constrain wrapping
-            
-            term_height = term_para.wrap(available_width, max_height)[1]
-            pronunciation_height = pronunciation_para.wrap(available_width, max_height)[1]
-            definition_height = definition_para.wrap(available_width, max_height)[1]
-            
-            # Add spacing between elements including all style spacing
-            total_height = (term_height + scaled_term_spacing + 
-                          pronunciation_height + scaled_pronunciation_spacing + 
-                          scaled_line_width + scaled_definition_space_before + 
-                          definition_height)
-            
-            # Font-specific adjustments - different fonts need different spacing
-            font_padding = 0
-            
-            # Check for custom TTF fonts (they often have unpredictable metrics)
-            if hasattr(title_style, 'fontName') and ('_' in str(title_style.fontName) or any(char.isdigit() for char in str(title_style.fontName)[-10:])):
-                font_padding += scaled_term_size * 0.20  # Increased from 15% to 20%
-                
-            if hasattr(pronunciation_style, 'fontName') and ('_' in str(pronunciation_style.fontName) or any(char.isdigit() for char in str(pronunciation_style.fontName)[-10:])):
-                font_padding += scaled_pronunciation_size * 0.20  # Increased from 15% to 20%
-                
-            if hasattr(definition_style, 'fontName') and ('_' in str(definition_style.fontName) or any(char.isdigit() for char in str(definition_style.fontName)[-10:])):
-                font_padding += scaled_definition_size * 0.20  # Increased from 15% to 20%
-            
-            total_height += font_padding
-            
-            # Add extra spacing that ReportLab applies (leading adjustments, etc.)
-            extra_leading = int(12 * scale_factor)  # From definition_style leading
-            pronunciation_leading = int(4 * scale_factor)  # From pronunciation_style leading  
-            
-            total_height += extra_leading + pronunciation_leading
-            
-            # ReportLab can add unexpected spacing for long text blocks
-            # Add extra padding for multi-line content (the sneaky overflow culprit)
-            definition_line_count = max(1, len(row['definition']) // 80)  # Rough estimate of lines
-            if definition_line_count > 2:  # Multi-line definitions need extra space
-                multiline_padding = definition_line_count * int(8 * scale_factor)
-                total_height += multiline_padding
-            
-            # Character-specific adjustments for special characters that can affect height
-            text_content = f"{row['term']} {row['pronunciation']} {row['definition']}"
-            if any(ord(char) > 127 for char in text_content):  # Non-ASCII characters
-                unicode_padding = int(6 * scale_factor)
-                total_height += unicode_padding
-            
-            # Increased safety margin from 5% to 10% to catch edge cases
-            safety_margin = total_height * 0.10
-                
-            return total_height + safety_margin
-            
-        except Exception as e:
-            # Fallback to conservative estimate if measurement fails
-            import streamlit as st
-            st.warning(f"Height calculation failed, using conservative estimate: {e}")
-            return 8 * scale_factor * inch  # Conservative fallback
-    
-    def get_end_positioned_spacer_amount(position, page_h, scaled_margin, content_height):
-        """Your way: content ENDS at consistent margins, not starts"""
-        content_area_height = page_h - 2 * scaled_margin
-        
-        if position == "top":
-            return 0  # Start at top margin, flow down (same as before)
-        elif position == "middle":
-            # Center the content block in the page
-            spacer = (content_area_height - content_height) / 2
-            return max(0, spacer)  # Prevent negative spacer if content is too large
-        elif position == "bottom":
-            # END at bottom margin - calculate where to START so it ends there
-            # Just like top starts at top margin, bottom ENDS at bottom margin
-            spacer = content_area_height - content_height
-            # Add extra conservative margin for bottom positioning (most problematic)
-            conservative_bottom_margin = int(20 * scale_factor)
-            spacer = spacer - conservative_bottom_margin
-            return max(0, spacer)  # Prevent negative spacer if content is too large
-        else:
-            return 0  # fallback to top
-    
-    # Get alignment constant
-    def get_alignment_constant(alignment):
-        from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
-        alignments = {
-            "left": TA_LEFT,
-            "center": TA_CENTER, 
-            "right": TA_RIGHT
-        }
-        return alignments.get(alignment, TA_LEFT)
-    
-    text_align_const = get_alignment_constant(text_alignment)
-    # spacer_amount will be calculated per-row based on content
-    
-    # Convert hex color to RGB for ReportLab
-    def hex_to_rgb(hex_color):
-        """Convert hex color to RGB tuple (0-1 range)"""
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16)/255.0 for i in (0, 2, 4))
-    
-    bg_color = hex_to_rgb(page_color)
-    term_rgb = hex_to_rgb(term_color)
-    pronunciation_rgb = hex_to_rgb(pronunciation_color)
-    line_rgb = hex_to_rgb(line_color)
-    definition_rgb = hex_to_rgb(definition_color)
-    
-    doc = SimpleDocTemplate(output_file, pagesize=page_size,
-                          rightMargin=scaled_margin, leftMargin=scaled_margin,
-                          topMargin=scaled_margin, bottomMargin=scaled_margin)
-    
-    # Create custom page template with background color
-    from reportlab.platypus import PageTemplate, Frame
-    from reportlab.lib.colors import Color
-    
-    class ColoredPageTemplate(PageTemplate):
-        def __init__(self, id, frames, bg_color, **kwargs):
-            super().__init__(id, frames, **kwargs)
-            self.bg_color = bg_color
+# Worker processes
+def _process_pool_context():
+    """Start method for worker pools: forkserver where available, else the platform default
+    
+    Streamlit serves sessions from many threads, so forking it directly can copy a lock
+    another thread holds and deadlock the child; forkserver forks from a single-threaded
+    server process instead.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return None
+
+# Long-lived worker pool (cache_resource: started once per server and shared by every
+# session, so presses don't pay for process start-up)
+PARALLEL_MIN_ROWS = 500  # Total rows across all sizes; below this, building in-process is faster
+POOL_MAX_WORKERS = 4  # MuPDF rendering gains flatten out beyond about four processes
+
+def _pool_workers():
+    """Worker processes for the shared pool: one per CPU, capped at POOL_MAX_WORKERS"""
+    return min(os.cpu_count() or 1, POOL_MAX_WORKERS)
+
+@st.cache_resource(show_spinner=False)
+def _worker_pool():
+    """Process pool shared across reruns and sessions"""
+    return concurrent.futures.ProcessPoolExecutor(max_workers=_pool_workers(), mp_context=_process_pool_context(),
+                                                  initializer=_init_worker)
+
+PNG_PARALLEL_MIN_PAGES = 8  # Below this, process start-up costs more than it saves
+
+# ReportLab stamps every build with fresh timestamps and a random /ID; masking them
+# lets identical PDFs share one digest
+PDF_VOLATILE_FIELDS = re.compile(rb"/(?:CreationDate|ModDate) \([^)]*\)|/ID\s*\[[^\]]*\]")
+
+def _pdf_content_digest(pdf_path):
+    """Digest of a PDF's content, ignoring per-build metadata"""
+    with open(pdf_path, 'rb') as file:
+        data = file.read()
+    return hashlib.blake2b(PDF_VOLATILE_FIELDS.sub(b'', data), digest_size=16).hexdigest()
+
+def _render_pdf_pngs(pdf_path, dpi, progress_callback=None):
+    """Yield rendered (filename, PNG bytes) pairs in page order"""
+    # Pages are encoded straight to PNG bytes; callers stream them into the ZIP without touching disk
+    # Open PDF document
+    pdf_document = fitz.open(pdf_path)
+    total_pages = pdf_document.page_count
+    
+    workers = _pool_workers()
+    if workers < 2 or total_pages < PNG_PARALLEL_MIN_PAGES:
+        # Create transformation matrix for DPI scaling
+        # 72 DPI is default, so scale factor = target_dpi / 72
+        scale_factor = dpi / 72.0
+        matrix = fitz.Matrix(scale_factor, scale_factor)
         
-        def beforeDrawPage(self, canvas, doc):
-            # Fill entire page with background color
-            canvas.saveState()
-            canvas.setFillColor(Color(*self.bg_color))
-            canvas.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-            canvas.restoreState()
-    
-    # Create frame for content (same margins as SimpleDocTemplate)
-    frame = Frame(scaled_margin, scaled_margin, 
-                  page_width - 2*scaled_margin, page_height - 2*scaled_margin,
-                  id='normal')
-    
-    # Create custom document with colored background
-    from reportlab.platypus import BaseDocTemplate
-    doc = BaseDocTemplate(output_file, pagesize=page_size)
-    
-    # Add the colored page template
-    colored_template = ColoredPageTemplate('colored', [frame], bg_color)
-    doc.addPageTemplates([colored_template])
-    
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Custom styles using user-selected fonts, sizes, and colors
-    from reportlab.lib.colors import Color
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=scaled_term_size,
-        spaceAfter=scaled_term_spacing,
-        alignment=text_align_const,
-        fontName=title_font,
-        leading=scaled_term_size,
-        textColor=Color(*term_rgb)
-    )
-    
-    pronunciation_style = ParagraphStyle(
-        'Pronunciation',
-        parent=styles['Normal'],
-        fontSize=scaled_pronunciation_size,
-        spaceAfter=scaled_pronunciation_spacing,
-        alignment=text_align_const,
-        fontName=pronunciation_font_name,
-        leading=scaled_pronunciation_size + int(4 * scale_factor),
-        textColor=Color(*pronunciation_rgb)
-    )
-    
-    definition_style = ParagraphStyle(
-        'Definition',
-        parent=styles['Normal'],
-        fontSize=scaled_definition_size,
-        spaceBefore=scaled_definition_space_before,
-        alignment=text_align_const,
-        fontName=definition_font_name,
-        leading=scaled_definition_size + int(12 * scale_factor),
-        textColor=Color(*definition_rgb)
-    )
-    
-    # Read CSV and create pages
-    with open(csv_file, 'r', encoding='utf-8-sig') as file:
-        reader = csv.DictReader(file)
-        first_page = True
-        available_width = page_width - 2 * scaled_margin
-        
-        for row in reader:
-            if not first_page:
-                story.append(PageBreak())
-            first_page = False
-            
-            # Calculate basic content height (simple measurement, no complex safety margins)
-            content_height = calculate_content_height(row, title_style, pronunciation_style, 
-                                                    definition_style, available_width)
-            
-            # Your way: content ENDS at consistent margins
-            spacer_amount = get_end_positioned_spacer_amount(page_position, page_height, 
-                                                           scaled_margin, content_height)
-            
-            # Add spacing for positioning (from top)
-            story.append(Spacer(1, spacer_amount))
-            
-            # Title (lowercase)
-            title = Paragraph(row['term'].lower(), title_style)
-            story.append(title)
-            
-            # Pronunciation with type
-            pronunciation_text = f"{row['pronunciation']} • ({row['type']})"
-            pronunciation = Paragraph(pronunciation_text, pronunciation_style)
-            story.append(pronunciation)
-            
-            # Horizontal line (scaled)
-            story.append(LineFlowable(scaled_line_length, line_rgb, line_width=scaled_line_width))
-            
-            # Definition
-            definition = Paragraph(row['definition'], definition_style)
-            story.append(definition)
-    
-    doc.build(story)
-    return True
-
-# Quote Generation Function
-def create_quotes_pdf_from_csv(csv_file, output_file, 
-                              quote_font=None, quote_size=48, 
-                              page_color="#FFFFFF", quote_color="#000000",
-                              page_width_inches=11, page_height_inches=14, text_alignment="center", page_position="middle"):
-    """Create PDF with quotes from CSV file (one quote per line)"""
-    
-    def register_font_safe(font_path, base_name):
-        """Safely register a font with unique name to avoid conflicts"""
-        if font_path and font_path.endswith('.ttf') and os.path.exists(font_path):
-            try:
-                unique_name = f"{base_name}_{int(time.time() * 1000)}"
-                pdfmetrics.registerFont(TTFont(unique_name, font_path))
-                return unique_name
-            except Exception as e:
-                st.warning(f"Failed to register {font_path}: {e}")
-                return 'Times-Bold'
-        elif font_path in ['Times-Bold', 'Helvetica-Bold', 'Helvetica', 'Times-Roman', 'Courier', 'Courier-Bold']:
-            return font_path
-        else:
-            return 'Times-Bold'
-    
-    # Register font with Unicode support (same as dictionary mode)
-    quote_font_name = register_font_safe(quote_font, 'QuoteFont')
-    
-    # Enhanced Unicode support for built-in fonts (same as dictionary mode)
-    unicode_font = 'Helvetica'
-    unicode_font_bold = 'Helvetica-Bold'
-    
-    if quote_font_name in ['Helvetica-Bold', 'Helvetica']:
-        try:
-            font_configs = [
-                ('C:/Windows/Fonts/segoeui.ttf', 'C:/Windows/Fonts/segoeuib.ttf'),
-                ('/mnt/c/Windows/Fonts/segoeui.ttf', '/mnt/c/Windows/Fonts/segoeuib.ttf'),
-            ]
-            
-            for regular_path, bold_path in font_configs:
-                if os.path.exists(regular_path):
-                    try:
-                        unicode_name = f"Unicode_{int(time.time() * 1000)}"
-                        unicode_bold_name = f"UnicodeBold_{int(time.time() * 1000)}"
-                        
-                        pdfmetrics.registerFont(TTFont(unicode_name, regular_path))
-                        unicode_font = unicode_name
-                        
-                        if os.path.exists(bold_path):
-                            pdfmetrics.registerFont(TTFont(unicode_bold_name, bold_path))
-                            unicode_font_bold = unicode_bold_name
-                        
-                        break
-                    except Exception:
-                        continue
-        except Exception:
-            pass
-    
-    # Update built-in font references to Unicode versions
-    if quote_font_name == 'Helvetica-Bold':
-        quote_font_name = unicode_font_bold
-    elif quote_font_name == 'Helvetica':
-        quote_font_name = unicode_font
-    
-    # Page setup
-    page_width = page_width_inches * inch
-    page_height = page_height_inches * inch
-    page_size = (page_width, page_height)
-    
-    # Calculate scaling factors
-    baseline_width = 11.0
-    baseline_height = 14.0
-    width_scale = page_width_inches / baseline_width
-    height_scale = page_height_inches / baseline_height
-    scale_factor = (width_scale + height_scale) / 2
-    
-    # Scale font size and margins
-    scaled_quote_size = int(quote_size * scale_factor)
-    scaled_margin = 1.5 * scale_factor * inch  # Same margins as dictionary
-    
-    # Get alignment constant
-    def get_alignment_constant(alignment):
-        from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
-        alignments = {
-            "left": TA_LEFT,
-            "center": TA_CENTER, 
-            "right": TA_RIGHT
-        }
-        return alignments.get(alignment, TA_CENTER)  # Default center for quotes
-    
-    text_align_const = get_alignment_constant(text_alignment)
-    
-    # Robust content height calculation (same logic as dictionary mode)
-    def calculate_quote_height(quote_text, quote_style, available_width):
-        """Calculate the total height needed for quote content with proper safety margins"""
+        # Convert each page to PNG, handing it on before rendering the next
         try:
-            # Create temporary paragraph to measure its height
-            quote_para = Paragraph(quote_text, quote_style)
-            
-            # Measure actual height using ReportLab's wrap method
-            # Use a reasonable max height to force proper wrapping calculation
-            max_height = 20 * inch  # Large enough to not constrain wrapping
-            
-            quote_height = quote_para.wrap(available_width, max_height)[1]
-            
-            # Font-specific adjustments - different fonts need different spacing
-            font_padding = 0
-            
-            # Check for custom TTF fonts (they often have unpredictable metrics)
-            if hasattr(quote_style, 'fontName') and ('_' in str(quote_style.fontName) or any(char.isdigit() for char in str(quote_style.fontName)[-10:])):
-                font_padding += scaled_quote_size * 0.20  # Increased from 15% to 20%
-            
-            quote_height += font_padding
-            
-            # Add extra spacing that ReportLab applies (leading adjustments, etc.)
-            extra_leading = int(12 * scale_factor)  # From quote_style leading
-            quote_height += extra_leading
-            
-            # ReportLab can add unexpected spacing for long text blocks
-            # Add extra padding for multi-line quotes (the sneaky overflow culprit)
-            quote_line_count = max(1, len(quote_text) // 80)  # Rough estimate of lines
-            if quote_line_count > 2:  # Multi-line quotes need extra space
-                multiline_padding = quote_line_count * int(8 * scale_factor)
-                quote_height += multiline_padding
-            
-            # Character-specific adjustments for special characters that can affect height
-            if any(ord(char) > 127 for char in quote_text):  # Non-ASCII characters
-                unicode_padding = int(6 * scale_factor)
-                quote_height += unicode_padding
-            
-            # Increased safety margin from 5% to 10% to catch edge cases
-            safety_margin = quote_height * 0.10
+            for page_num in range(total_pages):
+                yield _render_png_page(pdf_document, page_num, matrix)
                 
-            return quote_height + safety_margin
-            
-        except Exception as e:
-            # Fallback to conservative estimate if measurement fails
-            import streamlit as st
-            st.warning(f"Quote height calculation failed, using conservative estimate: {e}")
-            return 8 * scale_factor * inch  # Conservative fallback
-    
-    # Exact same positioning approach as dictionary mode (your way: content ENDS at consistent margins)
-    def get_quote_spacer_amount(position, page_h, scaled_margin, content_height):
-        """Your way: content ENDS at consistent margins, not starts"""
-        content_area_height = page_h - 2 * scaled_margin
-        
-        if position == "top":
-            return 0  # Start at top margin, flow down (same as before)
-        elif position == "middle":
-            # Center the content block in the page
-            spacer = (content_area_height - content_height) / 2
-            return max(0, spacer)  # Prevent negative spacer if content is too large
-        elif position == "bottom":
-            # END at bottom margin - calculate where to START so it ends there
-            # Just like top starts at top margin, bottom ENDS at bottom margin
-            spacer = content_area_height - content_height
-            # Add extra conservative margin for bottom positioning (most problematic)
-            conservative_bottom_margin = int(20 * scale_factor)
-            spacer = spacer - conservative_bottom_margin
-            return max(0, spacer)  # Prevent negative spacer if content is too large
-        else:
-            return 0  # fallback to top
-    
-    # Convert colors
-    def hex_to_rgb(hex_color):
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16)/255.0 for i in (0, 2, 4))
-    
-    bg_color = hex_to_rgb(page_color)
-    quote_rgb = hex_to_rgb(quote_color)
-    
-    # Create document with colored background
-    from reportlab.platypus import PageTemplate, Frame, BaseDocTemplate
-    from reportlab.lib.colors import Color
-    
-    class ColoredPageTemplate(PageTemplate):
-        def __init__(self, id, frames, bg_color, **kwargs):
-            super().__init__(id, frames, **kwargs)
-            self.bg_color = bg_color
-        
-        def beforeDrawPage(self, canvas, doc):
-            canvas.saveState()
-            canvas.setFillColor(Color(*self.bg_color))
-            canvas.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-            canvas.restoreState()
-    
-    frame = Frame(scaled_margin, scaled_margin, 
-                  page_width - 2*scaled_margin, page_height - 2*scaled_margin,
-                  id='normal')
-    
-    doc = BaseDocTemplate(output_file, pagesize=page_size)
-    colored_template = ColoredPageTemplate('colored', [frame], bg_color)
-    doc.addPageTemplates([colored_template])
-    
-    story = []
-    
-    # Quote style with proper leading calculation (same as dictionary mode)
-    quote_style = ParagraphStyle(
-        'Quote',
-        fontSize=scaled_quote_size,
-        alignment=text_align_const,
-        fontName=quote_font_name,
-        leading=scaled_quote_size + int(12 * scale_factor),  # Same leading calculation as dictionary
-        textColor=Color(*quote_rgb)
-    )
-    
-    # Read CSV (one quote per line)
-    available_width = page_width - 2 * scaled_margin
-    
-    with open(csv_file, 'r', encoding='utf-8-sig') as file:
-        first_page = True
-        
-        for line_num, line in enumerate(file, 1):
-            quote_text = line.strip()
-            if not quote_text:  # Skip empty lines
-                continue
-                
-            if not first_page:
-                story.append(PageBreak())
-            first_page = False
-            
-            # Calculate content height for this quote
-            content_height = calculate_quote_height(quote_text, quote_style, available_width)
-            
-            # Calculate positioning spacer
-            spacer_amount = get_quote_spacer_amount(page_position, page_height, 
-                                                  scaled_margin, content_height)
-            
-            # Add positioning spacer
-            story.append(Spacer(1, spacer_amount))
-            
-            # Add quote without quotation marks
-            quote_paragraph = Paragraph(quote_text, quote_style)
-            story.append(quote_paragraph)
-    
-    doc.build(story)
-    return True
-
-# Authored Quote Generation Function
-def create_authored_quotes_pdf_from_csv(csv_file, output_file, 
-                                       quote_font=None, quote_size=48, 
-                                       author_font=None, author_size=24,
-                                       page_color="#FFFFFF", quote_color="#000000", author_color="#000000",
-                                       page_width_inches=11, page_height_inches=14, text_alignment="left", page_position="bottom"):
-    """Create PDF with authored quotes from CSV file (quote,author format)"""
-    
-    def register_font_safe(font_path, base_name):
-        """Safely register a font with unique name to avoid conflicts"""
-        if font_path and font_path.endswith('.ttf') and os.path.exists(font_path):
-            try:
-                unique_name = f"{base_name}_{int(time.time() * 1000)}"
-                pdfmetrics.registerFont(TTFont(unique_name, font_path))
-                return unique_name
-            except Exception as e:
-                st.warning(f"Failed to register {font_path}: {e}")
-                return 'Times-Bold'
-        elif font_path in ['Times-Bold', 'Helvetica-Bold', 'Helvetica', 'Times-Roman', 'Courier', 'Courier-Bold']:
-            return font_path
-        else:
-            return 'Times-Bold'
-    
-    # Register fonts with Unicode support (same as dictionary mode)
-    quote_font_name = register_font_safe(quote_font, 'QuoteFont')
-    author_font_name = register_font_safe(author_font, 'AuthorFont')
-    
-    # Enhanced Unicode support for built-in fonts (same as dictionary mode)
-    unicode_font = 'Helvetica'
-    unicode_font_bold = 'Helvetica-Bold'
-    
-    for font_name in [quote_font_name, author_font_name]:
-        if font_name in ['Helvetica-Bold', 'Helvetica']:
-            try:
-                font_configs = [
-                    ('C:/Windows/Fonts/segoeui.ttf', 'C:/Windows/Fonts/segoeuib.ttf'),
-                    ('/mnt/c/Windows/Fonts/segoeui.ttf', '/mnt/c/Windows/Fonts/segoeuib.ttf'),
-                ]
-                
-                for regular_path, bold_path in font_configs:
-                    if os.path.exists(regular_path):
-                        try:
-                            unicode_name = f"Unicode_{int(time.time() * 1000)}"
-                            unicode_bold_name = f"UnicodeBold_{int(time.time() * 1000)}"
-                            
-                            pdfmetrics.registerFont(TTFont(unicode_name, regular_path))
-                            unicode_font = unicode_name
-                            
-                            if os.path.exists(bold_path):
-                                pdfmetrics.registerFont(TTFont(unicode_bold_name, bold_path))
-                                unicode_font_bold = unicode_bold_name
-                            
-                            break
-                        except Exception:
-                            continue
-            except Exception:
-                pass
-    
-    # Update built-in font references to Unicode versions
-    if quote_font_name == 'Helvetica-Bold':
-        quote_font_name = unicode_font_bold
-    elif quote_font_name == 'Helvetica':
-        quote_font_name = unicode_font
-        
-    if author_font_name == 'Helvetica-Bold':
-        author_font_name = unicode_font_bold
-    elif author_font_name == 'Helvetica':
-        author_font_name = unicode_font
-    
-    # Page setup
-    page_width = page_width_inches * inch
-    page_height = page_height_inches * inch
-    page_size = (page_width, page_height)
-    
-    # Calculate scaling factors
-    baseline_width = 11.0
-    baseline_height = 14.0
-    width_scale = page_width_inches / baseline_width
-    height_scale = page_height_inches / baseline_height
-    scale_factor = (width_scale + height_scale) / 2
-    
-    # Scale font sizes and margins
-    scaled_quote_size = int(quote_size * scale_factor)
-    scaled_author_size = int(author_size * scale_factor)
-    scaled_margin = 1.5 * scale_factor * inch
-    scaled_author_spacing = int(24 * scale_factor)  # Space between quote and author
-    
-    # Get alignment constant
-    def get_alignment_constant(alignment):
-        from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
-        alignments = {
-            "left": TA_LEFT,
-            "center": TA_CENTER, 
-            "right": TA_RIGHT
-        }
-        return alignments.get(alignment, TA_LEFT)  # Default left for authored quotes
-    
-    text_align_const = get_alignment_constant(text_alignment)
-    
-    # Robust content height calculation (same logic as dictionary mode)
-    def calculate_authored_quote_height(quote_text, author_text, quote_style, author_style, available_width):
-        """Calculate the total height needed for quote + author content with proper safety margins"""
-        try:
-            # Create temporary paragraphs to measure their height
-            quote_para = Paragraph(quote_text, quote_style)
-            author_para = Paragraph(author_text, author_style)
-            
-            # Measure actual heights using ReportLab's wrap method
-            max_height = 20 * inch  # Large enough to not constrain wrapping
-            
-            quote_height = quote_para.wrap(available_width, max_height)[1]
-            author_height = author_para.wrap(available_width, max_height)[1]
-            
-            # Add spacing between quote and author
-            total_height = quote_height + scaled_author_spacing + author_height
-            
-            # Font-specific adjustments - different fonts need different spacing
-            font_padding = 0
-            
-            # Check for custom TTF fonts (they often have unpredictable metrics)
-            if hasattr(quote_style, 'fontName') and ('_' in str(quote_style.fontName) or any(char.isdigit() for char in str(quote_style.fontName)[-10:])):
-                font_padding += scaled_quote_size * 0.20  # 20% extra for custom fonts
-                
-            if hasattr(author_style, 'fontName') and ('_' in str(author_style.fontName) or any(char.isdigit() for char in str(author_style.fontName)[-10:])):
-                font_padding += scaled_author_size * 0.20
-            
-            total_height += font_padding
-            
-            # Add extra spacing that ReportLab applies (leading adjustments, etc.)
-            extra_leading = int(12 * scale_factor)  # From quote_style leading
-            author_leading = int(4 * scale_factor)  # From author_style leading  
-            
-            total_height += extra_leading + author_leading
-            
-            # ReportLab can add unexpected spacing for long text blocks
-            # Add extra padding for multi-line content (the sneaky overflow culprit)
-            quote_line_count = max(1, len(quote_text) // 80)  # Rough estimate of lines
-            if quote_line_count > 2:  # Multi-line quotes need extra space
-                multiline_padding = quote_line_count * int(8 * scale_factor)
-                total_height += multiline_padding
-            
-            # Character-specific adjustments for special characters that can affect height
-            text_content = f"{quote_text} {author_text}"
-            if any(ord(char) > 127 for char in text_content):  # Non-ASCII characters
-                unicode_padding = int(6 * scale_factor)
-                total_height += unicode_padding
-            
-            # Increased safety margin from 5% to 10% to catch edge cases
-            safety_margin = total_height * 0.10
-                
-            return total_height + safety_margin
-            
-        except Exception as e:
-            # Fallback to conservative estimate if measurement fails
-            import streamlit as st
-            st.warning(f"Authored quote height calculation failed, using conservative estimate: {e}")
-            return 8 * scale_factor * inch  # Conservative fallback
-    
-    # Exact same positioning approach as dictionary mode (your way: content ENDS at consistent margins)
-    def get_authored_quote_spacer_amount(position, page_h, scaled_margin, content_height):
-        """Your way: content ENDS at consistent margins, not starts"""
-        content_area_height = page_h - 2 * scaled_margin
-        
-        if position == "top":
-            return 0  # Start at top margin, flow down (same as before)
-        elif position == "middle":
-            # Center the content block in the page
-            spacer = (content_area_height - content_height) / 2
-            return max(0, spacer)  # Prevent negative spacer if content is too large
-        elif position == "bottom":
-            # END at bottom margin - calculate where to START so it ends there
-            # Just like top starts at top margin, bottom ENDS at bottom margin
-            spacer = content_area_height - content_height
-            # Add extra conservative margin for bottom positioning (most problematic)
-            conservative_bottom_margin = int(20 * scale_factor)
-            spacer = spacer - conservative_bottom_margin
-            return max(0, spacer)  # Prevent negative spacer if content is too large
-        else:
-            return 0  # fallback to top
-    
-    # Convert colors
-    def hex_to_rgb(hex_color):
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16)/255.0 for i in (0, 2, 4))
-    
-    bg_color = hex_to_rgb(page_color)
-    quote_rgb = hex_to_rgb(quote_color)
-    author_rgb = hex_to_rgb(author_color)
-    
-    # Create document with colored background
-    from reportlab.platypus import PageTemplate, Frame, BaseDocTemplate
-    from reportlab.lib.colors import Color
-    
-    class ColoredPageTemplate(PageTemplate):
-        def __init__(self, id, frames, bg_color, **kwargs):
-            super().__init__(id, frames, **kwargs)
-            self.bg_color = bg_color
-        
-        def beforeDrawPage(self, canvas, doc):
-            canvas.saveState()
-            canvas.setFillColor(Color(*self.bg_color))
-            canvas.rect(0, 0, page_width, page_height, fill=1, stroke=0)
-            canvas.restoreState()
-    
-    frame = Frame(scaled_margin, scaled_margin, 
-                  page_width - 2*scaled_margin, page_height - 2*scaled_margin,
-                  id='normal')
-    
-    doc = BaseDocTemplate(output_file, pagesize=page_size)
-    colored_template = ColoredPageTemplate('colored', [frame], bg_color)
-    doc.addPageTemplates([colored_template])
-    
-    story = []
-    
-    # Quote and author styles with proper leading calculation (same as dictionary mode)
-    quote_style = ParagraphStyle(
-        'Quote',
-        fontSize=scaled_quote_size,
-        alignment=text_align_const,
-        fontName=quote_font_name,
-        leading=scaled_quote_size + int(12 * scale_factor),  # Same leading calculation as dictionary
-        textColor=Color(*quote_rgb)
-    )
-    
-    author_style = ParagraphStyle(
-        'Author',
-        fontSize=scaled_author_size,
-        spaceAfter=0,
-        alignment=text_align_const,
-        fontName=author_font_name,
-        leading=scaled_author_size + int(4 * scale_factor),  # Same leading calculation as dictionary
-        textColor=Color(*author_rgb)
-    )
-    
-    # Read CSV (quote,author format)
-    available_width = page_width - 2 * scaled_margin
-    
-    with open(csv_file, 'r', encoding='utf-8-sig') as file:
-        reader = csv.reader(file)
-        first_page = True
-        
-        for line_num, row in enumerate(reader, 1):
-            if len(row) < 2:  # Skip malformed rows
-                continue
-                
-            quote_text = row[0].strip()
-            author_text = row[1].strip()
-            
-            if not quote_text:  # Skip empty quotes
-                continue
-                
-            if not first_page:
-                story.append(PageBreak())
-            first_page = False
-            
-            # Calculate content height for this quote + author
-            content_height = calculate_authored_quote_height(quote_text, author_text, quote_style, author_style, available_width)
-            
-            # Calculate positioning spacer
-            spacer_amount = get_authored_quote_spacer_amount(page_position, page_height, 
-                                                           scaled_margin, content_height)
-            
-            # Add positioning spacer
-            story.append(Spacer(1, spacer_amount))
-            
-            # Add quote without quotation marks
-            quote_paragraph = Paragraph(quote_text, quote_style)
-            story.append(quote_paragraph)
-            
-            # Add spacing between quote and author
-            story.append(Spacer(1, scaled_author_spacing))
+                # Update progress if callback provided
+                if progress_callback:
+                    progress = (page_num + 1) / total_pages
+                    progress_callback(progress, f"Converting page {page_num + 1}/{total_pages}")
+        finally:
+            pdf_document.close()
+        return
+    
+    pdf_document.close()
+    
+    # Rasterizing is CPU-bound per page, so split the pages into contiguous runs
+    # (several per worker to keep the progress bar moving) and render them in parallel
+    chunk_size = math.ceil(total_pages / (workers * 4))
+    tasks = [(pdf_path, range(start, min(start + chunk_size, total_pages)), dpi)
+             for start in range(0, total_pages, chunk_size)]
+    
+    # Each worker reopens the PDF; MuPDF document handles aren't shared across processes.
+    # map returns runs in page order, so each run is passed on as soon as it is next in line.
+    # Every size in a run renders on the same shared pool
+    done_pages = 0
+    try:
+        for chunk_pages in _worker_pool().map(_render_png_pages, tasks):
+            yield from chunk_pages
+            done_pages += len(chunk_pages)
             
-            # Add author attribution
-            author_paragraph = Paragraph(author_text, author_style)
-            story.append(author_paragraph)
+            # Update progress if callback provided
+            if progress_callback:
+                progress_callback(done_pages / total_pages, f"Converting page {done_pages}/{total_pages}")
+    except concurrent.futures.BrokenExecutor:
+        _worker_pool.clear()  # A worker died; the next run starts a fresh pool
+        raise
+
+# Rendered pages keyed on (PDF digest, DPI), so re-running with unchanged input skips
+# rasterizing (cache_resource: shared across reruns and sessions without pickling)
+PNG_CACHE_MAX_BYTES = 128 << 20  # Renders larger than this stream through uncached
+
+@st.cache_resource(show_spinner=False)
+def _rendered_png_cache():
+    """(OrderedDict of key -> (pages, total bytes) in least-recently-used order, lock)"""
+    return collections.OrderedDict(), threading.Lock()
+
+def _iter_rendered_pngs(pdf_path, dpi, progress_callback=None):
+    """Yield (filename, PNG bytes) pairs, from the cache when identical PDF content was rendered before"""
+    key = (_pdf_content_digest(pdf_path), dpi)
+    cache, lock = _rendered_png_cache()
+    with lock:
+        cached = cache.get(key)
+        if cached is not None:
+            cache.move_to_end(key)
+    if cached is not None:
+        yield from cached[0]
+        return
+    
+    # Keep the pages only while the render stays small enough to cache
+    pages, total_bytes = [], 0
+    for page in _render_pdf_pngs(pdf_path, dpi, progress_callback):
+        if pages is not None:
+            total_bytes += len(page[1])
+            if total_bytes <= PNG_CACHE_MAX_BYTES:
+                pages.append(page)
+            else:
+                pages = None
+        yield page
     
-    doc.build(story)
-    return True
+    if pages is not None:
+        with lock:
+            cache[key] = (pages, total_bytes)
+            while len(cache) > 1 and sum(size for _, size in cache.values()) > PNG_CACHE_MAX_BYTES:
+                cache.popitem(last=False)
 
-def convert_pdf_to_png(pdf_path, output_folder, dpi=150, progress_callback=None):
-    """Convert PDF to PNG images with high quality using PyMuPDF"""
+def convert_pdf_to_png_bytes(pdf_path, dpi=150, progress_callback=None):
+    """Convert PDF to in-memory (page_NNN.png, PNG bytes) pairs using PyMuPDF, yielded page by page"""
     if not PYMUPDF_AVAILABLE:
         st.error("PyMuPDF library not available. Please install: pip install PyMuPDF")
-        return []
+        return
     
     try:
-        # Open PDF document
-        pdf_document = fitz.open(pdf_path)
-        png_files = []
-        total_pages = pdf_document.page_count
-        
-        # Ensure output folder exists
-        os.makedirs(output_folder, exist_ok=True)
-        
-        # Convert each page to PNG
-        for page_num in range(total_pages):
-            page = pdf_document[page_num]
-            
-            # Create transformation matrix for DPI scaling
-            # 72 DPI is default, so scale factor = target_dpi / 72
-            scale_factor = dpi / 72.0
-            matrix = fitz.Matrix(scale_factor, scale_factor)
-            
-            # Render page to pixmap (image)
-            pixmap = page.get_pixmap(matrix=matrix)
-            
-            # Save as PNG
-            png_filename = f"page_{page_num + 1:03d}.png"
-            png_path = os.path.join(output_folder, png_filename)
-            pixmap.save(png_path)
-            png_files.append(png_path)
-            
-            # Update progress if callback provided
-            if progress_callback:
-                progress = (page_num + 1) / total_pages
-                progress_callback(progress, f"Converting page {page_num + 1}/{total_pages}")
-            
-            # Clean up pixmap memory
-            pixmap = None
-        
-        # Close PDF document
-        pdf_document.close()
-        
-        return png_files
+        yield from _iter_rendered_pngs(pdf_path, dpi, progress_callback)
     except Exception as e:
         st.error(f"Failed to convert PDF to PNG: {str(e)}")
-        return []
-
-def generate_pngs_from_csv(csv_file, term_font, term_size, term_spacing,
-                          pronunciation_font, pronunciation_size, pronunciation_spacing,
-                          definition_font, definition_size, page_color,
-                          term_color, pronunciation_color, line_color, definition_color,
-                          text_alignment, page_position, generate_all_sizes, 
-                          page_width_inches=11, page_height_inches=14, document_type="Dictionary"):
-    """Generate PNGs by creating PDFs and converting them"""
+
+def _iter_document_pdfs(tasks):
+    """Yield (task index, result) as each _create_document_pdf task finishes"""
+    total_rows = sum(len(task.rows) for task in tasks)
+    if min(len(tasks), _pool_workers()) < 2 or total_rows < PARALLEL_MIN_ROWS:
+        for index, task in enumerate(tasks):
+            yield index, _create_document_pdf(task)
+        return
+    
+    # The documents are independent, so build them in parallel worker processes
+    executor = _worker_pool()
+    futures = {executor.submit(_create_document_pdf, task): index for index, task in enumerate(tasks)}
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            yield futures[future], future.result()
+    except concurrent.futures.BrokenExecutor:
+        _worker_pool.clear()  # A worker died; the next run starts a fresh pool
+        raise
+    finally:
+        # The pool outlives this run, so drop queued builds nobody will collect
+        for future in futures:
+            future.cancel()
+
+# Built PDFs keyed on the upload and every setting, so re-pressing Generate with
+# unchanged inputs reuses them (cache_resource: shared across reruns and sessions)
+PDF_CACHE_MAX_BYTES = 256 << 20  # Oldest PDFs are evicted beyond this
+
+@st.cache_resource(show_spinner=False)
+def _generated_pdf_cache():
+    """(OrderedDict of key -> PDF bytes in least-recently-used order, lock)"""
+    return collections.OrderedDict(), threading.Lock()
+
+def _iter_cached_document_pdfs(upload_key, tasks):
+    """Like _iter_document_pdfs for in-memory tasks, but skips PDFs already built for the same inputs"""
+    cache, lock = _generated_pdf_cache()
+    # Rows are covered by upload_key and the output is always None, so key on the rest
+    keys = [(upload_key, task._replace(rows=None)) for task in tasks]
+    
+    pending = []
+    for index, key in enumerate(keys):
+        with lock:
+            pdf_bytes = cache.get(key)
+            if pdf_bytes is not None:
+                cache.move_to_end(key)
+        if pdf_bytes is None:
+            pending.append(index)
+        else:
+            yield index, pdf_bytes
+    
+    for position, pdf_bytes in _iter_document_pdfs([tasks[index] for index in pending]):
+        index = pending[position]
+        if pdf_bytes is not None:
+            with lock:
+                cache[keys[index]] = pdf_bytes
+                while len(cache) > 1 and sum(map(len, cache.values())) > PDF_CACHE_MAX_BYTES:
+                    cache.popitem(last=False)
+        yield index, pdf_bytes
+
+# Standard poster sizes: (name, width inches, height inches)
+STANDARD_SIZES = [
+    ("11x14", 11, 14),
+    ("16x20", 16, 20),
+    ("18x24", 18, 24),
+    ("24x36", 24, 36),
+    ("A0", 33.1, 46.8)
+]
+
+# Background generation (the script thread only polls, so the progress bar keeps moving)
+def _generation_executor():
+    """This session's single build thread, kept in session state across reruns
+    
+    A build abandoned by a rerun can only hold up its own session, never another's.
+    """
+    executor = st.session_state.get('generation_executor')
+    if executor is None:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="csvibe-generate")
+        st.session_state.generation_executor = executor
+    return executor
+
+def _run_with_progress(progress_bar, progress, function, *args, **kwargs):
+    """Run function on the generation executor, advancing progress_bar until it returns"""
+    ctx = get_script_run_ctx()
+    
+    def run():
+        # Attach the session so st.warning/st.error inside the builders still reach the page
+        add_script_run_ctx(threading.current_thread(), ctx)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # Detach again; the thread is reused for later builds
+            setattr(threading.current_thread(), SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    
+    future = _generation_executor().submit(run)
+    try:
+        while True:
+            try:
+                return future.result(timeout=0.2)
+            except concurrent.futures.TimeoutError:
+                progress = min(progress + 1, 95)
+                progress_bar.progress(progress)
+    finally:
+        # A rerun stops the script mid-poll; a build still queued behind an abandoned one never starts
+        future.cancel()
+
+def generate_pngs_from_rows(rows, term_font, term_size, term_spacing,
+                           pronunciation_font, pronunciation_size, pronunciation_spacing,
+                           definition_font, definition_size, page_color,
+                           term_color, pronunciation_color, line_color, definition_color,
+                           text_alignment, page_position, generate_all_sizes, 
+                           page_width_inches=11, page_height_inches=14, document_type="Dictionary",
+                           selected_sizes=None):
+    """Generate PNGs by creating PDFs and converting them
+    
+    Yields (folder/page_NNN.png, PNG bytes) pairs so callers can zip pages as
+    they are rendered without writing them to disk.
+    """
     
     if not PYMUPDF_AVAILABLE:
         st.error("PNG generation requires PyMuPDF library. Please install: pip install PyMuPDF")
-        return None
-    
-    png_folders = []
-    temp_files = []
-    
-    try:
+        return
+    
+    # Every page size renders from the same parsed rows
+    settings = dict(term_font=term_font, term_size=term_size, term_spacing=term_spacing,
+                    pronunciation_font=pronunciation_font, pronunciation_size=pronunciation_size,
+                    pronunciation_spacing=pronunciation_spacing,
+                    definition_font=definition_font, definition_size=definition_size, page_color=page_color,
+                    term_color=term_color, pronunciation_color=pronunciation_color,
+                    line_color=line_color, definition_color=definition_color,
+                    text_alignment=text_alignment, page_position=page_position)
+    
+    # Intermediate PDFs share one temp directory that is removed on exit, even on error
+    with tempfile.TemporaryDirectory() as temp_dir:
         if generate_all_sizes:
-            # Generate PNGs for all standard sizes
-            standard_sizes = [
-                ("11x14", 11, 14),
-                ("16x20", 16, 20),
-                ("18x24", 18, 24),
-                ("24x36", 24, 36),
-                ("A0", 33.1, 46.8)
-            ]
-            
-            for size_name, width, height in standard_sizes:
-                # Create temporary PDF
-                with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_pdf:
-                    temp_pdf_path = tmp_pdf.name
-                    temp_files.append(temp_pdf_path)
-                
-                # Generate PDF based on document type
-                if document_type == "Dictionary":
-                    success = create_pdf_from_csv(
-                        csv_file, temp_pdf_path,
-                        term_font, term_size, term_spacing,
-                        pronunciation_font, pronunciation_size, pronunciation_spacing,
-                        definition_font, definition_size, page_color,
-                        term_color, pronunciation_color, line_color, definition_color,
-                        width, height, text_alignment, page_position
-                    )
-                elif document_type == "Authored Quotes":
-                    success = create_authored_quotes_pdf_from_csv(
-                        csv_file, temp_pdf_path,
-                        term_font, term_size,
-                        pronunciation_font, pronunciation_size,
-                        page_color, term_color, pronunciation_color,
-                        width, height, text_alignment, page_position
-                    )
-                else:  # Regular Quotes mode
-                    success = create_quotes_pdf_from_csv(
-                        csv_file, temp_pdf_path,
-                        term_font, term_size,
-                        page_color, term_color,
-                        width, height, text_alignment, page_position
-                    )
-                
-                if success:
-                    # Create folder for this size
+            # Generate PNGs for the selected standard sizes
+            standard_sizes = [size for size in STANDARD_SIZES if selected_sizes is None or size[0] in selected_sizes]
+                        
+            # The size PDFs are independent, so build them concurrently
+            tasks = [DocumentTask(document_type, rows, os.path.join(temp_dir, f"{size_name}.pdf"), width, height, **settings)
+                     for size_name, width, height in standard_sizes]
+            results = dict(_iter_document_pdfs(tasks))
+            
+            # Rasterize on the main thread; convert_pdf_to_png_bytes parallelizes across pages itself
+            for index, (size_name, width, height) in enumerate(standard_sizes):
+                temp_pdf_path = tasks[index].output_file
+                if results[index]:
+                    # ZIP folder for this size
                     folder_name = f"{document_type.lower().replace(' ', '_')}_pngs_{size_name}"
                     
                     def progress_update(progress, message):
                         # Update progress for this specific size conversion
-                        overall_progress = (len(png_folders) + progress) / len(standard_sizes)
+                        overall_progress = (index + progress) / len(standard_sizes)
                         st.session_state.conversion_progress = overall_progress
                         st.session_state.conversion_message = f"{size_name}: {message}"
                     
-                    png_files = convert_pdf_to_png(temp_pdf_path, folder_name, dpi=150, progress_callback=progress_update)
-                    
-                    if png_files:
-                        png_folders.append((folder_name, size_name, len(png_files)))
+                    for png_filename, png_bytes in convert_pdf_to_png_bytes(temp_pdf_path, dpi=150, progress_callback=progress_update):
+                        yield f"{folder_name}/{png_filename}", png_bytes
         
         else:
             # Generate single size PNG
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_pdf:
-                temp_pdf_path = tmp_pdf.name
-                temp_files.append(temp_pdf_path)
-            
-            # Generate PDF based on document type
-            if document_type == "Dictionary":
-                success = create_pdf_from_csv(
-                    csv_file, temp_pdf_path,
-                    term_font, term_size, term_spacing,
-                    pronunciation_font, pronunciation_size, pronunciation_spacing,
-                    definition_font, definition_size, page_color,
-                    term_color, pronunciation_color, line_color, definition_color,
-                    page_width_inches, page_height_inches, text_alignment, page_position
-                )
-            elif document_type == "Authored Quotes":
-                success = create_authored_quotes_pdf_from_csv(
-                    csv_file, temp_pdf_path,
-                    term_font, term_size,
-                    pronunciation_font, pronunciation_size,
-                    page_color, term_color, pronunciation_color,
-                    page_width_inches, page_height_inches, text_alignment, page_position
-                )
-            else:  # Regular Quotes mode
-                success = create_quotes_pdf_from_csv(
-                    csv_file, temp_pdf_path,
-                    term_font, term_size,
-                    page_color, term_color,
-                    page_width_inches, page_height_inches, text_alignment, page_position
-                )
+            temp_pdf_path = os.path.join(temp_dir, "document.pdf")
+            success = _create_document_pdf(DocumentTask(document_type, rows, temp_pdf_path,
+                                                        page_width_inches, page_height_inches, **settings))
             
             if success:
-                # Create folder for single size
+                # ZIP folder for single size
                 folder_name = f"{document_type.lower().replace(' ', '_')}_pngs_{page_width_inches}x{page_height_inches}"
                 
                 def progress_update(progress, message):
                     st.session_state.conversion_progress = progress
                     st.session_state.conversion_message = message
                 
-                png_files = convert_pdf_to_png(temp_pdf_path, folder_name, dpi=150, progress_callback=progress_update)
-                
-                if png_files:
-                    png_folders.append((folder_name, f"{page_width_inches}x{page_height_inches}", len(png_files)))
-        
-        # Clean up temporary PDF files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
-        
-        return png_folders
-        
-    except Exception as e:
-        # Clean up on error
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
-        raise e
-
-# Initialize session state
-if 'font_cache_initialized' not in st.session_state:
-    st.session_state.font_cache_initialized = False
-    st.session_state.available_fonts_list = None
+                for png_filename, png_bytes in convert_pdf_to_png_bytes(temp_pdf_path, dpi=150, progress_callback=progress_update):
+                    yield f"{folder_name}/{png_filename}", png_bytes
 
 # Font discovery and management
+# One pass over a font file name for the display-name cleanups
+FONT_NAME_CLEANUPS = {'.ttf': '', '.TTF': '', '-': ' ', '_': ' ', 'Regular': '', 'regular': '', 'bold': 'Bold', 'italic': 'Italic'}
+FONT_NAME_PATTERN = re.compile('|'.join(re.escape(token) for token in FONT_NAME_CLEANUPS))
+
+def _iter_ttf_files(font_dir):
+    """Yield (path, file name) for every TTF under font_dir, in os.walk order"""
+    subdirs = []
+    with os.scandir(font_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink():  # os.walk doesn't follow directory links either
+                    subdirs.append(entry.path)
+            elif entry.name.lower().endswith('.ttf'):
+                yield entry.path, entry.name
+    
+    for subdir in subdirs:
+        try:
+            yield from _iter_ttf_files(subdir)
+        except OSError:  # Unreadable subdirectories are skipped, as os.walk does
+            continue
+
+# The scanned font list is also kept on disk so a fresh process skips the filesystem walk
+FONT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "csvibe", "fonts.json")
+
+def _load_font_cache(mtimes):
+    """Return the cached font list if it was saved for the same directory mtimes"""
+    try:
+        with open(FONT_CACHE_PATH, 'r', encoding='utf-8') as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if isinstance(cache, dict) and cache.get('mtimes') == mtimes:
+        return cache.get('fonts')
+    return None
+
+def _save_font_cache(mtimes, fonts):
+    """Write the font list via a temp file and rename, so readers never see a partial file"""
+    cache_dir = os.path.dirname(FONT_CACHE_PATH)
+    temp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=cache_dir, suffix='.tmp', delete=False) as file:
+            temp_path = file.name
+            json.dump({'mtimes': mtimes, 'fonts': fonts}, file)
+        os.replace(temp_path, FONT_CACHE_PATH)
+    except OSError:
+        # The cache is only an optimization, but don't leave the temp file behind
+        if temp_path is not None:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+
 @st.cache_data
 def get_available_fonts():
     """Scan system for available TTF fonts"""
@@ -1099,540 +418,552 @@ def get_available_fonts():
         "/usr/share/fonts/truetype/",  # Linux
     ]
     
+    # Installing or removing a font changes its directory's mtime. Nested family folders
+    # aren't tracked, so "Refresh Fonts" forces a rescan for those
+    mtimes = [[font_dir, os.stat(font_dir).st_mtime_ns] for font_dir in font_dirs if os.path.exists(font_dir)]
+    cached_fonts = _load_font_cache(mtimes)
+    if cached_fonts:
+        return cached_fonts
+    
     for font_dir in font_dirs:
         if os.path.exists(font_dir):
             try:
-                for root, dirs, files in os.walk(font_dir):
-                    for file in files:
-                        if file.lower().endswith('.ttf'):
-                            font_path = os.path.join(root, file)
-                            
-                            # Create readable display name
-                            display_name = file.replace('.ttf', '').replace('.TTF', '')
-                            display_name = display_name.replace('-', ' ').replace('_', ' ')
-                            display_name = display_name.replace('Regular', '').replace('regular', '')
-                            display_name = display_name.replace('Bold', 'Bold').replace('bold', 'Bold')
-                            display_name = display_name.replace('Italic', 'Italic').replace('italic', 'Italic')
-                            display_name = ' '.join(display_name.split())
-                            
-                            if not display_name:
-                                display_name = file.replace('.ttf', '')
-                            
-                            fonts[font_path] = f"{display_name} ({file})"
+                for font_path, file in _iter_ttf_files(font_dir):
+                    # Create readable display name
+                    display_name = FONT_NAME_PATTERN.sub(lambda match: FONT_NAME_CLEANUPS[match.group()], file)
+                    display_name = ' '.join(display_name.split())
+                    
+                    if not display_name:
+                        display_name = file.replace('.ttf', '')
+                    
+                    fonts[font_path] = f"{display_name} ({file})"
             except Exception:
                 continue
     
+    _save_font_cache(mtimes, fonts)
     return fonts
 
-# Load fonts with caching
-if not st.session_state.font_cache_initialized:
-    with st.spinner("Scanning system fonts..."):
-        st.session_state.available_fonts_list = get_available_fonts()
-        st.session_state.font_cache_initialized = True
-
-available_fonts = st.session_state.available_fonts_list
-
-# Sidebar for settings
-st.sidebar.header("Settings")
-
-# Document Type
-st.sidebar.subheader("Document Type")
-document_type = st.sidebar.selectbox(
-    "Select Document Type",
-    options=["Dictionary", "Quotes", "Authored Quotes"],
-    index=0,
-    key="document_type",
-    help="Choose the type of document to generate"
-)
+# Upload validation (cached on the file bytes, so widget reruns skip re-parsing)
+@st.cache_data(show_spinner=False, max_entries=8)
+def _validate_dictionary(data):
+    """Return (missing required columns, entry count) for a dictionary CSV"""
+    df = pd.read_csv(io.BytesIO(data))
+    required_columns = ['term', 'pronunciation', 'type', 'definition']
+    return [col for col in required_columns if col not in df.columns], len(df)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _validate_quotes(data):
+    """Count non-empty quote lines"""
+    # Decode and split lines the way _read_quote_rows does, so the count matches the pages built
+    text = io.StringIO(data.decode('utf-8-sig'), newline=None)
+    return sum(1 for line in text if line.strip())
+
+def _upload_key(document_type, uploaded_file):
+    """Session cache key: the document mode plus a digest of the uploaded bytes"""
+    return document_type, hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()
+
+def _get_upload_rows(document_type, uploaded_file):
+    """Parsed rows for the upload, kept in session state until the file or mode changes"""
+    key = _upload_key(document_type, uploaded_file)
+    parsed = st.session_state.get('parsed_rows')
+    if parsed is None or parsed[0] != key:
+        parsed = (key, _read_document_rows(document_type, uploaded_file))
+        st.session_state.parsed_rows = parsed
+    return parsed[1]
+
+def _validate_upload(document_type, uploaded_file):
+    """Return (csv_valid, [(st message function name, text), ...]) for the upload
+    
+    The result is kept in session state, so reruns from sidebar changes reuse it
+    until a different file is uploaded or the document type changes.
+    """
+    key = _upload_key(document_type, uploaded_file)
+    validation = st.session_state.get('csv_validation')
+    if validation is not None and validation[0] == key:
+        return validation[1]
+    
+    # Validation based on document type
+    if document_type == "Dictionary":
+        missing_columns, entry_count = _validate_dictionary(uploaded_file.getvalue())
+        
+        if missing_columns:
+            result = False, [("error", f"Dictionary mode requires columns: {', '.join(missing_columns)}"),
+                             ("info", "Your CSV should have: term, pronunciation, type, definition")]
+        else:
+            result = True, [("success", f"Dictionary CSV loaded: {entry_count} entries found")]
+    elif document_type == "Authored Quotes":
+        # For authored quotes, validate CSV format (quote,author)
+        try:
+            # Parsed once here; the generate buttons reuse these rows
+            valid_quotes = sum(1 for _, author in _get_upload_rows(document_type, uploaded_file) if author)
+            
+            if valid_quotes > 0:
+                result = True, [("success", f"Authored Quotes CSV loaded: {valid_quotes} quotes found")]
+            else:
+                result = False, [("error", "No valid authored quotes found. Format should be: quote,author"),
+                                 ("info", "Example: \"The world is beautiful,-Henry Wadsworth Longfellow\"")]
+        except Exception as e:
+            result = False, [("error", f"Error reading authored quotes file: {e}")]
+    else:  # Regular Quotes mode
+        # For quotes, read line by line (no column validation needed)
+        try:
+            quote_count = _validate_quotes(uploaded_file.getvalue())
+            result = True, [("success", f"Quotes CSV loaded: {quote_count} quotes found")]
+        except Exception as e:
+            result = False, [("error", f"Error reading quotes file: {e}")]
+    
+    st.session_state.csv_validation = (key, result)
+    return result
 
-# Font management buttons
-col_refresh1, col_refresh2 = st.sidebar.columns(2)
-with col_refresh1:
-    if st.button("Refresh Fonts", help="Rescan system fonts and reset colors"):
+def main():
+    # Configure Streamlit page
+    st.set_page_config(
+        page_title="CSVibe - Dictionary Generator",
+        page_icon="📄",
+        layout="wide"
+    )
+
+    # Initialize session state
+    if 'font_cache_initialized' not in st.session_state:
         st.session_state.font_cache_initialized = False
-        # Reset all color selections to defaults
-        for key in ['page_color', 'term_color', 'pronunciation_color', 'line_color', 'definition_color']:
-            if key in st.session_state:
-                del st.session_state[key]
-        st.rerun()
-
-with col_refresh2:
-    if st.button("Clear Cache", help="Clear font cache and reset colors"):
-        try:
-            from reportlab.pdfbase.pdfmetrics import _fonts
-            for font_name in list(_fonts.keys()):
-                if 'Custom' in font_name or 'Unicode' in font_name:
-                    del _fonts[font_name]
+        st.session_state.available_fonts_list = None
+
+    # Load fonts with caching
+    if not st.session_state.font_cache_initialized:
+        with st.spinner("Scanning system fonts..."):
+            st.session_state.available_fonts_list = get_available_fonts()
+            st.session_state.font_cache_initialized = True
+
+    available_fonts = st.session_state.available_fonts_list
+
+    # Sidebar for settings
+    st.sidebar.header("Settings")
+
+    # Document Type
+    st.sidebar.subheader("Document Type")
+    document_type = st.sidebar.selectbox(
+        "Select Document Type",
+        options=["Dictionary", "Quotes", "Authored Quotes"],
+        index=0,
+        key="document_type",
+        help="Choose the type of document to generate"
+    )
+
+    # Font management buttons
+    col_refresh1, col_refresh2 = st.sidebar.columns(2)
+    with col_refresh1:
+        if st.button("Refresh Fonts", help="Rescan system fonts and reset colors"):
+            st.session_state.font_cache_initialized = False
+            # Drop both the in-memory and on-disk font lists so the rescan really happens
+            get_available_fonts.clear()
+            with contextlib.suppress(OSError):
+                os.remove(FONT_CACHE_PATH)
             # Reset all color selections to defaults
             for key in ['page_color', 'term_color', 'pronunciation_color', 'line_color', 'definition_color']:
                 if key in st.session_state:
                     del st.session_state[key]
-            st.sidebar.success("Cache cleared!")
-        except Exception:
-            st.sidebar.warning("Cache clear failed")
-
-# Font selection
-st.sidebar.subheader("Font Selection")
-st.sidebar.info(f"Found {len(available_fonts)} fonts")
-
-term_font = st.sidebar.selectbox(
-    "Terms Font",
-    options=list(available_fonts.keys()),
-    format_func=lambda x: available_fonts.get(x, x),
-    index=0,
-    key="term_font_select",
-    help="Font for the main term/word"
-)
+            st.rerun()
+
+    with col_refresh2:
+        if st.button("Clear Cache", help="Clear font cache and reset colors"):
+            try:
+                from reportlab.pdfbase.pdfmetrics import _fonts
+                for font_name in list(_fonts.keys()):
+                    if 'Custom' in font_name or 'Unicode' in font_name:
+                        del _fonts[font_name]
+                # Registered names were removed above, so forget them too
+                _get_registered_font.cache_clear()
+                _unicode_fallback_fonts.cache_clear()
+                _rendered_png_cache.clear()
+                _generated_pdf_cache.clear()
+                # Reset all color selections to defaults
+                for key in ['page_color', 'term_color', 'pronunciation_color', 'line_color', 'definition_color']:
+                    if key in st.session_state:
+                        del st.session_state[key]
+                st.sidebar.success("Cache cleared!")
+            except Exception:
+                st.sidebar.warning("Cache clear failed")
 
-# Document-specific font selections
-if document_type == "Dictionary":
-    pronunciation_font = st.sidebar.selectbox(
-        "Pronunciation Font", 
+    # Font selection
+    st.sidebar.subheader("Font Selection")
+    st.sidebar.info(f"Found {len(available_fonts)} fonts")
+
+    term_font = st.sidebar.selectbox(
+        "Terms Font",
         options=list(available_fonts.keys()),
         format_func=lambda x: available_fonts.get(x, x),
-        index=1 if len(available_fonts) > 1 else 0,
-        key="pronunciation_font_select",
-        help="Font for pronunciation and word type"
+        index=0,
+        key="term_font_select",
+        help="Font for the main term/word"
     )
 
-    definition_font = st.sidebar.selectbox(
-        "Definition Font",
-        options=list(available_fonts.keys()),
-        format_func=lambda x: available_fonts.get(x, x),
-        index=2 if len(available_fonts) > 2 else 0,
-        key="definition_font_select",
-        help="Font for the definition text"
+    # Document-specific font selections
+    if document_type == "Dictionary":
+        pronunciation_font = st.sidebar.selectbox(
+            "Pronunciation Font", 
+            options=list(available_fonts.keys()),
+            format_func=lambda x: available_fonts.get(x, x),
+            index=1 if len(available_fonts) > 1 else 0,
+            key="pronunciation_font_select",
+            help="Font for pronunciation and word type"
+        )
+
+        definition_font = st.sidebar.selectbox(
+            "Definition Font",
+            options=list(available_fonts.keys()),
+            format_func=lambda x: available_fonts.get(x, x),
+            index=2 if len(available_fonts) > 2 else 0,
+            key="definition_font_select",
+            help="Font for the definition text"
+        )
+    elif document_type == "Authored Quotes":
+        # Author font selection for authored quotes
+        pronunciation_font = st.sidebar.selectbox(
+            "Author Font", 
+            options=list(available_fonts.keys()),
+            format_func=lambda x: available_fonts.get(x, x),
+            index=1 if len(available_fonts) > 1 else 0,
+            key="pronunciation_font_select",
+            help="Font for author attribution"
+        )
+        definition_font = term_font  # Not used in authored quotes
+    else:
+        # For regular quotes mode, use term font for everything
+        pronunciation_font = term_font
+        definition_font = term_font
+
+
+    # Font sizes
+    st.sidebar.subheader("Font Sizes")
+    if document_type == "Dictionary":
+        term_size = st.sidebar.slider("Terms Size", 60, 120, 84, key="term_size")
+        pronunciation_size = st.sidebar.slider("Pronunciation Size", 20, 40, 28, key="pronunciation_size")
+        definition_size = st.sidebar.slider("Definition Size", 20, 40, 28, key="definition_size")
+    elif document_type == "Authored Quotes":
+        term_size = st.sidebar.slider("Quote Text Size", 20, 80, 48, key="term_size", help="Font size for quote text")
+        pronunciation_size = st.sidebar.slider("Author Size", 16, 36, 24, key="pronunciation_size", help="Font size for author attribution")
+        definition_size = term_size  # Not used in authored quotes
+    else:  # Regular Quotes mode
+        term_size = st.sidebar.slider("Quote Text Size", 20, 80, 48, key="term_size", help="Font size for quote text")
+        # Use same size for all quote elements
+        pronunciation_size = term_size
+        definition_size = term_size
+
+    # Page Size
+    st.sidebar.subheader("Page Size")
+    page_size_options = {
+        "11 × 14 inch (3300 × 4200 px)": (11, 14),
+        "16 × 20 inch (4800 × 6000 px)": (16, 20),
+        "18 × 24 inch (5400 × 7200 px)": (18, 24),
+        "24 × 36 inch (7200 × 10800 px)": (24, 36),
+        "33.1 × 46.8 inch - A0 (9930 × 14040 px)": (33.1, 46.8),
+        "Custom": (None, None)
+    }
+
+    selected_size = st.sidebar.selectbox(
+        "Select Page Size",
+        options=list(page_size_options.keys()),
+        index=0,
+        key="page_size_select"
     )
-elif document_type == "Authored Quotes":
-    # Author font selection for authored quotes
-    pronunciation_font = st.sidebar.selectbox(
-        "Author Font", 
-        options=list(available_fonts.keys()),
-        format_func=lambda x: available_fonts.get(x, x),
-        index=1 if len(available_fonts) > 1 else 0,
-        key="pronunciation_font_select",
-        help="Font for author attribution"
+
+    if selected_size == "Custom":
+        col_w, col_h = st.sidebar.columns(2)
+        with col_w:
+            custom_width = st.sidebar.number_input("Width (inches)", min_value=1.0, max_value=50.0, value=11.0, step=0.1, key="custom_width")
+        with col_h:
+            custom_height = st.sidebar.number_input("Height (inches)", min_value=1.0, max_value=50.0, value=14.0, step=0.1, key="custom_height")
+        page_width_inches, page_height_inches = custom_width, custom_height
+    else:
+        page_width_inches, page_height_inches = page_size_options[selected_size]
+
+    # Text Alignment & Positioning
+    st.sidebar.subheader("Text Alignment & Position")
+
+    # Text alignment (within the text group)
+    text_alignment = st.sidebar.selectbox(
+        "Text Alignment",
+        options=["left", "center", "right"],
+        index=0,
+        key="text_alignment",
+        help="How text is aligned within the text group"
     )
-    definition_font = term_font  # Not used in authored quotes
-else:
-    # For regular quotes mode, use term font for everything
-    pronunciation_font = term_font
-    definition_font = term_font
-
-
-# Font sizes
-st.sidebar.subheader("Font Sizes")
-if document_type == "Dictionary":
-    term_size = st.sidebar.slider("Terms Size", 60, 120, 84, key="term_size")
-    pronunciation_size = st.sidebar.slider("Pronunciation Size", 20, 40, 28, key="pronunciation_size")
-    definition_size = st.sidebar.slider("Definition Size", 20, 40, 28, key="definition_size")
-elif document_type == "Authored Quotes":
-    term_size = st.sidebar.slider("Quote Text Size", 20, 80, 48, key="term_size", help="Font size for quote text")
-    pronunciation_size = st.sidebar.slider("Author Size", 16, 36, 24, key="pronunciation_size", help="Font size for author attribution")
-    definition_size = term_size  # Not used in authored quotes
-else:  # Regular Quotes mode
-    term_size = st.sidebar.slider("Quote Text Size", 20, 80, 48, key="term_size", help="Font size for quote text")
-    # Use same size for all quote elements
-    pronunciation_size = term_size
-    definition_size = term_size
-
-# Page Size
-st.sidebar.subheader("Page Size")
-page_size_options = {
-    "11 × 14 inch (3300 × 4200 px)": (11, 14),
-    "16 × 20 inch (4800 × 6000 px)": (16, 20),
-    "18 × 24 inch (5400 × 7200 px)": (18, 24),
-    "24 × 36 inch (7200 × 10800 px)": (24, 36),
-    "33.1 × 46.8 inch - A0 (9930 × 14040 px)": (33.1, 46.8),
-    "Custom": (None, None)
-}
-
-selected_size = st.sidebar.selectbox(
-    "Select Page Size",
-    options=list(page_size_options.keys()),
-    index=0,
-    key="page_size_select"
-)
 
-if selected_size == "Custom":
-    col_w, col_h = st.sidebar.columns(2)
-    with col_w:
-        custom_width = st.sidebar.number_input("Width (inches)", min_value=1.0, max_value=50.0, value=11.0, step=0.1, key="custom_width")
-    with col_h:
-        custom_height = st.sidebar.number_input("Height (inches)", min_value=1.0, max_value=50.0, value=14.0, step=0.1, key="custom_height")
-    page_width_inches, page_height_inches = custom_width, custom_height
-else:
-    page_width_inches, page_height_inches = page_size_options[selected_size]
-
-# Text Alignment & Positioning
-st.sidebar.subheader("Text Alignment & Position")
-
-# Text alignment (within the text group)
-text_alignment = st.sidebar.selectbox(
-    "Text Alignment",
-    options=["left", "center", "right"],
-    index=0,
-    key="text_alignment",
-    help="How text is aligned within the text group"
-)
+    # Page positioning (vertical only)
+    page_position = st.sidebar.selectbox(
+        "Vertical Position",
+        options=["bottom", "middle", "top"],
+        index=0,  # bottom as current default
+        key="page_position",
+        help="Vertical position of content on the page"
+    )
 
-# Page positioning (vertical only)
-page_position = st.sidebar.selectbox(
-    "Vertical Position",
-    options=["bottom", "middle", "top"],
-    index=0,  # bottom as current default
-    key="page_position",
-    help="Vertical position of content on the page"
-)
+    # Generation options
+    generate_all_sizes = st.sidebar.checkbox("Generate All Standard Sizes", 
+                                             help="Generate PDFs in all standard sizes at once",
+                                             key="generate_all_sizes")
+    standard_size_names = [size_name for size_name, _, _ in STANDARD_SIZES]
+    if generate_all_sizes:
+        # Only the chosen sizes are built, so picking a subset skips the rest entirely
+        selected_sizes = st.sidebar.multiselect("Sizes", standard_size_names, default=standard_size_names,
+                                                key="selected_sizes")
+        if not selected_sizes:
+            st.sidebar.warning("Select at least one size to generate")
+    else:
+        selected_sizes = standard_size_names
+
+    # Spacing
+    if document_type == "Dictionary":
+        st.sidebar.subheader("Spacing")
+        term_spacing = st.sidebar.slider("After Terms", 20, 80, 48, key="term_spacing")
+        pronunciation_spacing = st.sidebar.slider("After Pronunciation", 20, 60, 36, key="pronunciation_spacing")
+    else:
+        # No spacing controls needed for quotes
+        term_spacing = 48
+        pronunciation_spacing = 36
+
+    # Colors
+    st.sidebar.subheader("Colors")
+    page_color = st.sidebar.color_picker("Background Color", "#FFFFFF", key="page_color")
 
-# Generation options
-generate_all_sizes = st.sidebar.checkbox("Generate All Standard Sizes", 
-                                         help="Generate PDFs in all standard sizes at once",
-                                         key="generate_all_sizes")
-
-# Spacing
-if document_type == "Dictionary":
-    st.sidebar.subheader("Spacing")
-    term_spacing = st.sidebar.slider("After Terms", 20, 80, 48, key="term_spacing")
-    pronunciation_spacing = st.sidebar.slider("After Pronunciation", 20, 60, 36, key="pronunciation_spacing")
-else:
-    # No spacing controls needed for quotes
-    term_spacing = 48
-    pronunciation_spacing = 36
-
-# Colors
-st.sidebar.subheader("Colors")
-page_color = st.sidebar.color_picker("Background Color", "#FFFFFF", key="page_color")
-
-if document_type == "Dictionary":
-    term_color = st.sidebar.color_picker("Terms Color", "#000000", key="term_color")
-    pronunciation_color = st.sidebar.color_picker("Pronunciation Color", "#000000", key="pronunciation_color")
-    line_color = st.sidebar.color_picker("Dividing Line Color", "#000000", key="line_color")
-    definition_color = st.sidebar.color_picker("Definition Color", "#000000", key="definition_color")
-elif document_type == "Authored Quotes":
-    term_color = st.sidebar.color_picker("Quote Text Color", "#000000", key="term_color")
-    pronunciation_color = st.sidebar.color_picker("Author Color", "#000000", key="pronunciation_color")
-    # Not used in authored quotes
-    line_color = term_color
-    definition_color = term_color
-else:  # Regular Quotes mode
-    term_color = st.sidebar.color_picker("Quote Text Color", "#000000", key="term_color")
-    # Use same color for all quote elements
-    pronunciation_color = term_color
-    line_color = term_color
-    definition_color = term_color
-
-# Main content area - File Upload
-st.header("File Upload")
-uploaded_file = st.file_uploader("Choose CSV file", type=['csv'])
-
-if uploaded_file is not None:
-    # Validation based on document type
     if document_type == "Dictionary":
-        df = pd.read_csv(uploaded_file)
-        required_columns = ['term', 'pronunciation', 'type', 'definition']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            st.error(f"Dictionary mode requires columns: {', '.join(missing_columns)}")
-            st.info("Your CSV should have: term, pronunciation, type, definition")
-            csv_valid = False
-        else:
-            st.success(f"Dictionary CSV loaded: {len(df)} entries found")
-            csv_valid = True
+        term_color = st.sidebar.color_picker("Terms Color", "#000000", key="term_color")
+        pronunciation_color = st.sidebar.color_picker("Pronunciation Color", "#000000", key="pronunciation_color")
+        line_color = st.sidebar.color_picker("Dividing Line Color", "#000000", key="line_color")
+        definition_color = st.sidebar.color_picker("Definition Color", "#000000", key="definition_color")
     elif document_type == "Authored Quotes":
-        # For authored quotes, validate CSV format (quote,author)
-        try:
-            content = uploaded_file.read().decode('utf-8')
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
-            valid_quotes = 0
-            
-            for line in lines:
-                if ',' in line:
-                    parts = line.split(',', 1)  # Split on first comma only
-                    if len(parts) == 2 and parts[0].strip() and parts[1].strip():
-                        valid_quotes += 1
-            
-            if valid_quotes > 0:
-                st.success(f"Authored Quotes CSV loaded: {valid_quotes} quotes found")
-                csv_valid = True
-            else:
-                st.error("No valid authored quotes found. Format should be: quote,author")
-                st.info("Example: \"The world is beautiful,-Henry Wadsworth Longfellow\"")
-                csv_valid = False
-            
-            # Reset file pointer for later use
-            uploaded_file.seek(0)
-        except Exception as e:
-            st.error(f"Error reading authored quotes file: {e}")
-            csv_valid = False
+        term_color = st.sidebar.color_picker("Quote Text Color", "#000000", key="term_color")
+        pronunciation_color = st.sidebar.color_picker("Author Color", "#000000", key="pronunciation_color")
+        # Not used in authored quotes
+        line_color = term_color
+        definition_color = term_color
     else:  # Regular Quotes mode
-        # For quotes, read line by line (no column validation needed)
-        try:
-            content = uploaded_file.read().decode('utf-8')
-            quotes = [line.strip() for line in content.splitlines() if line.strip()]
-            st.success(f"Quotes CSV loaded: {len(quotes)} quotes found")
-            csv_valid = True
-            # Reset file pointer for later use
-            uploaded_file.seek(0)
-        except Exception as e:
-            st.error(f"Error reading quotes file: {e}")
-            csv_valid = False
-    
-    if csv_valid:
-        
-        # Generate buttons side by side
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            generate_pdf = st.button("Generate PDF", type="primary", use_container_width=True)
-        with col2:
-            generate_png = st.button("Generate PNGs", type="secondary", use_container_width=True)
-        
-        if generate_pdf:
-            status_placeholder = st.empty()
-            progress_bar = st.progress(0)
-            
-            try:
-                # Save uploaded file temporarily
-                with tempfile.NamedTemporaryFile(mode='wb', suffix='.csv', delete=False) as tmp_file:
-                    tmp_file.write(uploaded_file.getbuffer())
-                    temp_csv_path = tmp_file.name
-                
-                progress_bar.progress(25)
-                status_placeholder.info("Processing CSV data...")
-                
-                if generate_all_sizes:
-                    # Generate PDFs for all standard sizes
-                    standard_sizes = [
-                        ("11x14", 11, 14),
-                        ("16x20", 16, 20),
-                        ("18x24", 18, 24),
-                        ("24x36", 24, 36),
-                        ("A0", 33.1, 46.8)
-                    ]
-                    
-                    zip_files = []
-                    total_sizes = len(standard_sizes)
-                    
-                    for i, (size_name, width, height) in enumerate(standard_sizes):
-                        progress = 25 + (i * 60 // total_sizes)
-                        progress_bar.progress(progress)
-                        status_placeholder.info(f"Generating {size_name} ({width}×{height} inch)...")
-                        
+        term_color = st.sidebar.color_picker("Quote Text Color", "#000000", key="term_color")
+        # Use same color for all quote elements
+        pronunciation_color = term_color
+        line_color = term_color
+        definition_color = term_color
+
+    # Main content area - File Upload
+    st.header("File Upload")
+    uploaded_file = st.file_uploader("Choose CSV file", type=['csv'])
+
+    if uploaded_file is not None:
+        csv_valid, validation_messages = _validate_upload(document_type, uploaded_file)
+        for level, message in validation_messages:
+            getattr(st, level)(message)
+
+        if csv_valid:
+
+            # Generate buttons side by side (nothing to build with an empty size selection)
+            col1, col2 = st.columns(2)
+            no_sizes = not selected_sizes
+
+            with col1:
+                generate_pdf = st.button("Generate PDF", type="primary", use_container_width=True, disabled=no_sizes)
+            with col2:
+                generate_png = st.button("Generate PNGs", type="secondary", use_container_width=True, disabled=no_sizes)
+
+            if generate_pdf:
+                status_placeholder = st.empty()
+                progress_bar = st.progress(0)
+
+                try:
+                    # Parsed once per upload (validation may already have done it); every path reuses the rows
+                    rows = _get_upload_rows(document_type, uploaded_file)
+
+                    progress_bar.progress(25)
+                    status_placeholder.info("Processing CSV data...")
+
+                    if generate_all_sizes:
+                        # Generate PDFs for the selected standard sizes
+                        standard_sizes = [size for size in STANDARD_SIZES if size[0] in selected_sizes]
+
+                        document_prefix = document_type.lower().replace(' ', '_')
+                        # No output path: each PDF comes back as bytes, straight into the in-memory ZIP
+                        tasks = [DocumentTask(document_type=document_type, rows=rows, output_file=None,
+                                              width=width, height=height,
+                                              term_font=term_font, term_size=term_size, term_spacing=term_spacing,
+                                              pronunciation_font=pronunciation_font,
+                                              pronunciation_size=pronunciation_size,
+                                              pronunciation_spacing=pronunciation_spacing,
+                                              definition_font=definition_font, definition_size=definition_size,
+                                              page_color=page_color, term_color=term_color,
+                                              pronunciation_color=pronunciation_color, line_color=line_color,
+                                              definition_color=definition_color,
+                                              text_alignment=text_alignment, page_position=page_position)
+                                 for size_name, width, height in standard_sizes]
+                        total_sizes = len(standard_sizes)
+                        status_placeholder.info(f"Generating {total_sizes} sizes...")
+
+                        # Sizes finish in any order; progress advances as each one completes
+                        pdf_results = {}
+                        for done, (index, pdf_bytes) in enumerate(_iter_cached_document_pdfs(_upload_key(document_type, uploaded_file), tasks), 1):
+                            size_name, width, height = standard_sizes[index]
+                            progress_bar.progress(25 + (done * 60 // total_sizes))
+                            status_placeholder.info(f"Generated {size_name} ({width}×{height} inch) [{done}/{total_sizes}]")
+
+                            if pdf_bytes is not None:
+                                pdf_results[index] = pdf_bytes
+
+                        if pdf_results:
+                            pdf_count = len(pdf_results)
+
+                            # Build the ZIP in memory, keeping standard size order
+                            # PDF content is already compressed; re-deflating wastes CPU for <1% size savings
+                            zip_buffer = io.BytesIO()
+                            with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED) as zipf:
+                                for index, (size_name, _, _) in enumerate(standard_sizes):
+                                    if index in pdf_results:
+                                        zipf.writestr(f"{document_prefix}_{size_name}.pdf", pdf_results.pop(index))
+
+                            progress_bar.progress(100)
+                            status_placeholder.success(f"Generated {pdf_count} PDFs in all sizes!")
+
+                            # Provide ZIP download
+                            st.download_button(
+                                label="Download All Sizes (ZIP)",
+                                data=zip_buffer.getvalue(),
+                                file_name="dictionary_all_sizes.zip",
+                                mime="application/zip"
+                            )
+                        else:
+                            status_placeholder.error("Failed to generate PDFs")
+
+                    else:
+                        # Generate single PDF with selected size
+                        progress_bar.progress(50)
+                        status_placeholder.info(f"Applying fonts and generating {document_type} PDF...")
+
+                        # Build straight into memory for the download button, off the script thread
+                        pdf_buffer = io.BytesIO()
                         if document_type == "Dictionary":
-                            output_path = f"dictionary_{size_name}.pdf"
-                            success = create_pdf_from_csv(
-                                temp_csv_path, 
-                                output_path,
-                                term_font, term_size, term_spacing,
-                                pronunciation_font, pronunciation_size, pronunciation_spacing,
-                                definition_font, definition_size, page_color,
-                                term_color, pronunciation_color, line_color, definition_color,
-                                width, height, text_alignment, page_position
+                            success = _run_with_progress(
+                                progress_bar, 50, create_pdf_from_rows,
+                                rows,
+                                pdf_buffer,
+                                term_font=term_font, term_size=term_size, term_spacing=term_spacing,
+                                pronunciation_font=pronunciation_font, pronunciation_size=pronunciation_size,
+                                pronunciation_spacing=pronunciation_spacing,
+                                definition_font=definition_font, definition_size=definition_size, page_color=page_color,
+                                term_color=term_color, pronunciation_color=pronunciation_color,
+                                line_color=line_color, definition_color=definition_color,
+                                page_width_inches=page_width_inches, page_height_inches=page_height_inches,
+                                text_alignment=text_alignment, page_position=page_position
                             )
                         elif document_type == "Authored Quotes":
-                            output_path = f"authored_quotes_{size_name}.pdf"
-                            success = create_authored_quotes_pdf_from_csv(
-                                temp_csv_path,
-                                output_path,
+                            success = _run_with_progress(
+                                progress_bar, 50, create_authored_quotes_pdf_from_rows,
+                                rows,
+                                pdf_buffer,
                                 term_font, term_size,  # Quote font/size
                                 pronunciation_font, pronunciation_size,  # Author font/size
                                 page_color, term_color, pronunciation_color,  # Quote & author colors
-                                width, height, text_alignment, page_position
+                                page_width_inches, page_height_inches, text_alignment, page_position
                             )
                         else:  # Regular Quotes mode
-                            output_path = f"quotes_{size_name}.pdf"
-                            success = create_quotes_pdf_from_csv(
-                                temp_csv_path,
-                                output_path,
+                            success = _run_with_progress(
+                                progress_bar, 50, create_quotes_pdf_from_rows,
+                                rows,
+                                pdf_buffer,
                                 term_font, term_size,  # Use term font/size for quotes
                                 page_color, term_color,  # Use term color for quote text
-                                width, height, text_alignment, page_position
-                            )
-                        
-                        if success and os.path.exists(output_path):
-                            filename = f"{document_type.lower().replace(' ', '_')}_{size_name}.pdf"
-                            zip_files.append((output_path, filename))
-                    
-                    if zip_files:
-                        # Create ZIP file with all PDFs
-                        import zipfile
-                        zip_path = "dictionary_all_sizes.zip"
-                        with zipfile.ZipFile(zip_path, 'w') as zipf:
-                            for file_path, archive_name in zip_files:
-                                zipf.write(file_path, archive_name)
-                                os.unlink(file_path)  # Clean up individual files
-                        
-                        progress_bar.progress(100)
-                        status_placeholder.success(f"Generated {len(zip_files)} PDFs in all sizes!")
-                        
-                        # Provide ZIP download
-                        with open(zip_path, "rb") as zip_file:
-                            zip_bytes = zip_file.read()
-                            st.download_button(
-                                label="Download All Sizes (ZIP)",
-                                data=zip_bytes,
-                                file_name="dictionary_all_sizes.zip",
-                                mime="application/zip"
+                                page_width_inches, page_height_inches, text_alignment, page_position
                             )
-                        os.unlink(zip_path)  # Clean up ZIP file
-                    else:
-                        status_placeholder.error("Failed to generate PDFs")
-                
-                else:
-                    # Generate single PDF with selected size
-                    progress_bar.progress(50)
-                    status_placeholder.info(f"Applying fonts and generating {document_type} PDF...")
-                    
-                    if document_type == "Dictionary":
-                        output_path = "generated_dictionary.pdf"
-                        success = create_pdf_from_csv(
-                            temp_csv_path, 
-                            output_path,
-                            term_font, term_size, term_spacing,
-                            pronunciation_font, pronunciation_size, pronunciation_spacing,
-                            definition_font, definition_size, page_color,
-                            term_color, pronunciation_color, line_color, definition_color,
-                            page_width_inches, page_height_inches, text_alignment, page_position
-                        )
-                    elif document_type == "Authored Quotes":
-                        output_path = "generated_authored_quotes.pdf"
-                        success = create_authored_quotes_pdf_from_csv(
-                            temp_csv_path,
-                            output_path,
-                            term_font, term_size,  # Quote font/size
-                            pronunciation_font, pronunciation_size,  # Author font/size
-                            page_color, term_color, pronunciation_color,  # Quote & author colors
-                            page_width_inches, page_height_inches, text_alignment, page_position
-                        )
-                    else:  # Regular Quotes mode
-                        output_path = "generated_quotes.pdf"
-                        success = create_quotes_pdf_from_csv(
-                            temp_csv_path,
-                            output_path,
-                            term_font, term_size,  # Use term font/size for quotes
-                            page_color, term_color,  # Use term color for quote text
-                            page_width_inches, page_height_inches, text_alignment, page_position
-                        )
-                    
-                    if success:
-                        progress_bar.progress(100)
-                        size_text = f"{page_width_inches}×{page_height_inches} inch"
-                        status_placeholder.success(f"{document_type} PDF generated successfully! ({size_text})")
-                        
-                        # Provide download
-                        with open(output_path, "rb") as pdf_file:
-                            pdf_bytes = pdf_file.read()
+
+                        if success:
+                            progress_bar.progress(100)
+                            size_text = f"{page_width_inches}×{page_height_inches} inch"
+                            status_placeholder.success(f"{document_type} PDF generated successfully! ({size_text})")
+
+                            # Provide download
                             download_filename = f"{document_type.lower().replace(' ', '_')}.pdf"
                             st.download_button(
                                 label=f"Download {document_type} PDF",
-                                data=pdf_bytes,
+                                data=pdf_buffer.getvalue(),
                                 file_name=download_filename,
                                 mime="application/pdf"
                             )
-                
-            except Exception as e:
-                progress_bar.progress(0)
-                status_placeholder.error(f"Error: {str(e)}")
-            
-            finally:
-                # Clean up
-                if 'temp_csv_path' in locals() and os.path.exists(temp_csv_path):
-                    os.unlink(temp_csv_path)
-        
-        elif generate_png:
-            if not PYMUPDF_AVAILABLE:
-                st.error("PNG generation requires PyMuPDF library. Please install it:")
-                st.code("pip install PyMuPDF", language="bash")
-                st.info("PyMuPDF has no system dependencies - just install and it works!")
-            else:
-                status_placeholder = st.empty()
-                progress_bar = st.progress(0)
-                
-                try:
-                    # Save uploaded file temporarily
-                    with tempfile.NamedTemporaryFile(mode='wb', suffix='.csv', delete=False) as tmp_file:
-                        tmp_file.write(uploaded_file.getbuffer())
-                        temp_csv_path = tmp_file.name
-                    
-                    progress_bar.progress(25)
-                    status_placeholder.info("Processing CSV data...")
-                    
-                    # Generate PNGs
-                    progress_bar.progress(50)
-                    status_placeholder.info("Generating PNGs...")
-                    
-                    # Pass document type to PNG generation
-                    png_folders = generate_pngs_from_csv(
-                        temp_csv_path,
-                        term_font, term_size, term_spacing,
-                        pronunciation_font, pronunciation_size, pronunciation_spacing,
-                        definition_font, definition_size, page_color,
-                        term_color, pronunciation_color, line_color, definition_color,
-                        text_alignment, page_position, generate_all_sizes,
-                        page_width_inches, page_height_inches, document_type
-                    )
-                    
-                    if png_folders:
-                        progress_bar.progress(75)
-                        status_placeholder.info("Creating ZIP archive...")
-                        
-                        # Create ZIP file with all PNG folders
-                        zip_path = f"{document_type.lower().replace(' ', '_')}_pngs.zip"
-                        with zipfile.ZipFile(zip_path, 'w') as zipf:
-                            for folder_name, size_name, file_count in png_folders:
-                                # Add all PNG files from each folder to ZIP
-                                for root, dirs, files in os.walk(folder_name):
-                                    for file in files:
-                                        if file.endswith('.png'):
-                                            file_path = os.path.join(root, file)
-                                            # Preserve folder structure in ZIP
-                                            arc_name = os.path.relpath(file_path, '.')
-                                            zipf.write(file_path, arc_name)
-                                
-                                # Clean up folder after adding to ZIP
-                                shutil.rmtree(folder_name, ignore_errors=True)
-                        
-                        progress_bar.progress(100)
-                        total_folders = len(png_folders)
-                        total_files = sum(count for _, _, count in png_folders)
-                        status_placeholder.success(f"Generated {total_files} PNG files in {total_folders} size(s)!")
-                        
-                        # Provide ZIP download
-                        with open(zip_path, "rb") as zip_file:
-                            zip_bytes = zip_file.read()
+
+                except Exception as e:
+                    progress_bar.progress(0)
+                    status_placeholder.error(f"Error: {str(e)}")
+
+            elif generate_png:
+                if not PYMUPDF_AVAILABLE:
+                    st.error("PNG generation requires PyMuPDF library. Please install it:")
+                    st.code("pip install PyMuPDF", language="bash")
+                    st.info("PyMuPDF has no system dependencies - just install and it works!")
+                else:
+                    status_placeholder = st.empty()
+                    progress_bar = st.progress(0)
+
+                    try:
+                        # Parsed once per upload (validation may already have done it)
+                        rows = _get_upload_rows(document_type, uploaded_file)
+
+                        progress_bar.progress(25)
+                        status_placeholder.info("Processing CSV data...")
+
+                        # Generate PNGs
+                        progress_bar.progress(50)
+                        status_placeholder.info("Generating PNGs...")
+
+                        # Zip pages as they are rendered; the archive keeps one folder per size
+                        zip_buffer = io.BytesIO()
+                        folder_counts = {}
+                        # PNG content is already compressed; re-deflating wastes CPU for <1% size savings
+                        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED) as zipf:
+                            # Pass document type to PNG generation
+                            for arc_name, png_bytes in generate_pngs_from_rows(
+                                rows,
+                                term_font, term_size, term_spacing,
+                                pronunciation_font, pronunciation_size, pronunciation_spacing,
+                                definition_font, definition_size, page_color,
+                                term_color, pronunciation_color, line_color, definition_color,
+                                text_alignment, page_position, generate_all_sizes,
+                                page_width_inches, page_height_inches, document_type, selected_sizes
+                            ):
+                                zipf.writestr(arc_name, png_bytes)
+                                folder_name = arc_name.split('/', 1)[0]
+                                folder_counts[folder_name] = folder_counts.get(folder_name, 0) + 1
+
+                        if folder_counts:
+                            progress_bar.progress(100)
+                            total_folders = len(folder_counts)
+                            total_files = sum(folder_counts.values())
+                            status_placeholder.success(f"Generated {total_files} PNG files in {total_folders} size(s)!")
+
+                            # Provide ZIP download
                             st.download_button(
                                 label=f"Download {document_type} PNGs (ZIP)",
-                                data=zip_bytes,
+                                data=zip_buffer.getvalue(),
                                 file_name=f"{document_type.lower().replace(' ', '_')}_pngs.zip",
                                 mime="application/zip"
                             )
-                        
-                        # Show folder structure
-                        st.info("**Folder structure:**")
-                        for folder_name, size_name, file_count in png_folders:
-                            st.write(f"└── `{folder_name}/` ({file_count} PNG files)")
-                        
-                        os.unlink(zip_path)  # Clean up ZIP file
-                    else:
-                        status_placeholder.error("Failed to generate PNG files")
-                
-                except Exception as e:
-                    progress_bar.progress(0)
-                    status_placeholder.error(f"Error: {str(e)}")
-                
-                finally:
-                    # Clean up
-                    if 'temp_csv_path' in locals() and os.path.exists(temp_csv_path):
-                        os.unlink(temp_csv_path)
 
+                            # Show folder structure
+                            st.info("**Folder structure:**")
+                            for folder_name, file_count in folder_counts.items():
+                                st.write(f"└── `{folder_name}/` ({file_count} PNG files)")
+                        else:
+                            status_placeholder.error("Failed to generate PNG files")
 
-# Footer
-st.markdown("---")
-st.markdown("""
+                    except Exception as e:
+                        progress_bar.progress(0)
+                        status_placeholder.error(f"Error: {str(e)}")
+
+
+    # Footer
+    st.markdown("---")
+    st.markdown("""
 <div style='text-align: center; color: #25656E; padding: 20px;'>
     <p><strong>CSVibe</strong> - CSV meets beautiful design</p>
     <p>Contact: <span style='color: white;'>shzbkh1@gmail.com</span> | Discord: <span style='color: white;'>shzbk</span></p>
 </div>
 """, unsafe_allow_html=True)
+
+# Pool workers import this script as __mp_main__ before running a task; they only
+# need pdf_builders, so the page itself runs only under Streamlit
+if __name__ == '__main__':
+    main()
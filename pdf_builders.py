@@ -0,0 +1,1101 @@
+"""PDF builders and process-pool entry points
+
+Kept out of app.py so pool workers import only what they run, not the Streamlit page.
+"""
+import streamlit as st
+import os
+import io
+import tempfile
+import csv
+import collections
+import functools
+import hashlib
+import math
+import operator
+import contextlib
+import shutil
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
+from reportlab.lib.colors import Color
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus.flowables import Flowable
+
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+# Text alignment options
+TEXT_ALIGNMENTS = {
+    "left": TA_LEFT,
+    "center": TA_CENTER,
+    "right": TA_RIGHT
+}
+
+# Line flowable for horizontal lines
+class LineFlowable(Flowable):
+    def __init__(self, width, color=(0, 0, 0), height=6, line_width=4):
+        Flowable.__init__(self)
+        self.width = width
+        self.height = height
+        self.color = color
+        # Accept a prebuilt Color so one object can be shared by every page
+        self.color_obj = color if isinstance(color, Color) else Color(*color)
+        self.line_width = line_width
+
+    def draw(self):
+        self.canv.setLineWidth(self.line_width)
+        self.canv.setStrokeColor(self.color_obj)
+        self.canv.line(0, 0, self.width, 0)
+
+# Frame offset for vertical positioning
+class FrameOffset(Flowable):
+    """Move the frame's drawing position down without laying out a Spacer"""
+    def __init__(self, offset):
+        Flowable.__init__(self)
+        self.offset = offset
+
+    def frameAction(self, frame):
+        # Frame calls this instead of wrapping/drawing the flowable
+        if self.offset > 0:
+            frame._y -= self.offset
+            frame._atTop = 0
+
+# Single-line text flowable (fast path for short terms)
+class SingleLineText(Flowable):
+    """One line of plain text drawn with drawString instead of a full Paragraph"""
+    def __init__(self, text, style):
+        Flowable.__init__(self)
+        self.text = text
+        self.style = style  # Supplies font, color, alignment and spacing
+
+    def wrap(self, availWidth, availHeight):
+        # Same footprint as a one-line Paragraph: full width, one leading tall
+        self.width = availWidth
+        self.height = self.style.leading
+        return self.width, self.height
+
+    def draw(self):
+        style = self.style
+        # Baseline sits one font size below the top, as in Paragraph
+        y = self.height - style.fontSize
+        self.canv.saveState()
+        self.canv.setFillColor(style.textColor)
+        self.canv.setFont(style.fontName, style.fontSize)
+        if style.alignment == TA_CENTER:
+            self.canv.drawCentredString(self.width / 2, y, self.text)
+        elif style.alignment == TA_RIGHT:
+            self.canv.drawRightString(self.width, y, self.text)
+        else:
+            self.canv.drawString(0, y, self.text)
+        self.canv.restoreState()
+
+def make_text_flowable(text, style, available_width):
+    """Use SingleLineText when the text fits on one line, otherwise a Paragraph"""
+    # Markup and entities still need Paragraph's parser
+    if text.strip() and '<' not in text and '&' not in text:
+        line = ' '.join(text.split())  # Paragraph collapses whitespace the same way
+        if _string_width(line, style.fontName, style.fontSize) <= available_width:
+            return SingleLineText(line, style)
+    return Paragraph(text, style)
+
+# Page template that paints a solid background behind every page
+class ColoredPageTemplate(PageTemplate):
+    def __init__(self, id, frames, bg_color, page_width, page_height, **kwargs):
+        super().__init__(id, frames, **kwargs)
+        self.bg_color = bg_color
+        self.bg_color_obj = Color(*bg_color)  # Built once, not on every page
+        self.page_width = page_width
+        self.page_height = page_height
+    
+    def beforeDrawPage(self, canvas, doc):
+        if self.bg_color == (1.0, 1.0, 1.0):  # White is the page's natural color
+            return
+        # Fill entire page with background color
+        canvas.saveState()
+        canvas.setFillColor(self.bg_color_obj)
+        canvas.rect(0, 0, self.page_width, self.page_height, fill=1, stroke=0)
+        canvas.restoreState()
+
+# Font registration cache (this module is imported once, so it outlives Streamlit reruns
+# like ReportLab's font registry does, and each pool worker parses a font only once)
+@functools.lru_cache(maxsize=256)
+def _get_registered_font(font_path, mtime, font_name=None):
+    """Register a TTF font once per (path, mtime) and return its stable name"""
+    if font_name is None:
+        # Name derived from the path so it stays a valid, repeatable PDF identifier
+        font_name = f"CustomFont_{hashlib.sha1(font_path.encode('utf-8')).hexdigest()[:12]}"
+    pdfmetrics.registerFont(TTFont(font_name, font_path))
+    return font_name
+
+@functools.lru_cache(maxsize=None)
+def _unicode_fallback_fonts():
+    """Find Unicode-capable replacements for Helvetica once per process"""
+    unicode_font = 'Helvetica'
+    unicode_font_bold = 'Helvetica-Bold'
+    
+    font_configs = [
+        ('C:/Windows/Fonts/segoeui.ttf', 'C:/Windows/Fonts/segoeuib.ttf'),
+        ('/mnt/c/Windows/Fonts/segoeui.ttf', '/mnt/c/Windows/Fonts/segoeuib.ttf'),
+    ]
+    
+    for regular_path, bold_path in font_configs:
+        if os.path.exists(regular_path):
+            try:
+                unicode_font = _get_registered_font(regular_path, os.path.getmtime(regular_path), 'SegoeUnicode_Regular')
+                
+                if os.path.exists(bold_path):
+                    unicode_font_bold = _get_registered_font(bold_path, os.path.getmtime(bold_path), 'SegoeUnicode_Bold')
+                
+                break
+            except Exception:
+                continue
+    
+    return unicode_font, unicode_font_bold
+
+def _is_custom_font(font_name):
+    """Registered TTF names carry underscores or digits; their metrics need extra room"""
+    return '_' in font_name or any(char.isdigit() for char in font_name[-10:])
+
+# Text measurement helpers
+@functools.lru_cache(maxsize=4096)
+def _string_width(text, font_name, font_size):
+    """Cached pdfmetrics.stringWidth for repeated measurements"""
+    return pdfmetrics.stringWidth(text, font_name, font_size)
+
+@functools.lru_cache(maxsize=8192)
+def _glyph_advance(font_name, font_size, char):
+    """Cached advance width of a single glyph"""
+    return pdfmetrics.stringWidth(char, font_name, font_size)
+
+@functools.lru_cache(maxsize=64)
+def _ascii_advances(font_name, font_size):
+    """Advance widths for printable ASCII, built once per font and size"""
+    return {chr(code): _glyph_advance(font_name, font_size, chr(code)) for code in range(32, 127)}
+
+def _text_width(text, font_name, font_size):
+    """Width of text, summed from cached per-glyph advances"""
+    if text.isascii():
+        advances = _ascii_advances(font_name, font_size)
+        try:
+            return sum(advances[char] for char in text)
+        except KeyError:  # Control characters aren't in the table
+            pass
+    return sum(_glyph_advance(font_name, font_size, char) for char in text)
+
+def _wrapped_line_count(text, font_name, font_size, available_width, space_shrinkage=0.05):
+    """Greedy word-wrap line count matching Paragraph.breakLines for plain text
+    
+    Returns None for markup, non-breaking spaces or words wider than a line, which
+    Paragraph handles specially (str.split() breaks at U+00A0; Paragraph keeps it).
+    """
+    if '<' in text or '&' in text or '\xa0' in text:
+        return None
+    space_width = _text_width(' ', font_name, font_size)
+    space_shrink = space_shrinkage * space_width
+    line_count = 0
+    line_width = 0
+    line_words = 0
+    for word in text.split():
+        word_width = _text_width(word, font_name, font_size)
+        if word_width > available_width:
+            return None
+        if line_words and line_width + space_width + word_width <= available_width + space_shrink * line_words:
+            line_width += space_width + word_width
+            line_words += 1
+        else:
+            line_count += 1
+            line_width = word_width
+            line_words = 1
+    return line_count
+
+def estimate_paragraph_height(text, style, available_width):
+    """Estimate a paragraph's wrapped height from its string width"""
+    line_count = max(1, math.ceil(_text_width(text, style.fontName, style.fontSize) / available_width))
+    return line_count * style.leading
+
+# Color parsing
+def _hex_to_rgb(hex_color):
+    """Convert hex color to RGB tuple (0-1 range)"""
+    value = int(hex_color.lstrip('#'), 16)
+    return ((value >> 16 & 0xFF) / 255.0, (value >> 8 & 0xFF) / 255.0, (value & 0xFF) / 255.0)
+
+# PDF output
+PDF_WRITE_BUFFER_SIZE = 1 << 20  # 1 MiB
+PDF_SPOOL_MAX_SIZE = 64 << 20  # PDFs larger than this spill to a temp file
+
+def _new_pdf_buffer(output_file):
+    """Buffer to build into: a writable output_file itself, otherwise a spool that keeps
+    small PDFs in memory and spills large ones to disk"""
+    if hasattr(output_file, 'write'):
+        return output_file
+    return tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE, mode='w+b')
+
+def _save_pdf_buffer(pdf_buffer, output_file):
+    """Copy a built PDF buffer to its output path in large chunks"""
+    if pdf_buffer is output_file:
+        return  # Built directly into the caller's file object
+    pdf_buffer.seek(0)
+    with open(output_file, 'wb') as file:
+        shutil.copyfileobj(pdf_buffer, file, length=PDF_WRITE_BUFFER_SIZE)
+    pdf_buffer.close()
+
+# Dictionary paragraph styles
+def _make_dictionary_styles(alignment,
+                            term_font, term_size, term_spacing, term_rgb,
+                            pronunciation_font, pronunciation_size, pronunciation_spacing,
+                            pronunciation_leading, pronunciation_rgb,
+                            definition_font, definition_size, definition_space_before,
+                            definition_leading, definition_rgb):
+    """Build the term, pronunciation and definition styles"""
+    styles = getSampleStyleSheet()
+    
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=term_size,
+        spaceAfter=term_spacing,
+        alignment=alignment,
+        fontName=term_font,
+        leading=term_size,
+        textColor=Color(*term_rgb)
+    )
+    
+    pronunciation_style = ParagraphStyle(
+        'Pronunciation',
+        parent=styles['Normal'],
+        fontSize=pronunciation_size,
+        spaceAfter=pronunciation_spacing,
+        alignment=alignment,
+        fontName=pronunciation_font,
+        leading=pronunciation_leading,
+        textColor=Color(*pronunciation_rgb)
+    )
+    
+    definition_style = ParagraphStyle(
+        'Definition',
+        parent=styles['Normal'],
+        fontSize=definition_size,
+        spaceBefore=definition_space_before,
+        alignment=alignment,
+        fontName=definition_font,
+        leading=definition_leading,
+        textColor=Color(*definition_rgb)
+    )
+    
+    return title_style, pronunciation_style, definition_style
+
+# Quote paragraph style
+def _make_quote_style(alignment, quote_font, quote_size, quote_leading, quote_rgb):
+    """Build the quote style"""
+    return ParagraphStyle(
+        'Quote',
+        fontSize=quote_size,
+        alignment=alignment,
+        fontName=quote_font,
+        leading=quote_leading,
+        textColor=Color(*quote_rgb)
+    )
+
+# Authored quote paragraph styles
+def _make_authored_quote_styles(alignment,
+                                quote_font, quote_size, quote_leading, quote_rgb,
+                                author_font, author_size, author_leading, author_rgb):
+    """Build the quote and author styles"""
+    quote_style = ParagraphStyle(
+        'Quote',
+        fontSize=quote_size,
+        alignment=alignment,
+        fontName=quote_font,
+        leading=quote_leading,
+        textColor=Color(*quote_rgb)
+    )
+    
+    author_style = ParagraphStyle(
+        'Author',
+        fontSize=author_size,
+        spaceAfter=0,
+        alignment=alignment,
+        fontName=author_font,
+        leading=author_leading,
+        textColor=Color(*author_rgb)
+    )
+    
+    return quote_style, author_style
+
+# CSV row readers (parsed once, then shared by every page size)
+CSV_READ_BUFFER_SIZE = 1 << 20  # 1 MiB reads instead of the 8 KiB default
+
+@contextlib.contextmanager
+def _open_csv_text(csv_source):
+    """Open a CSV path or binary file object (e.g. BytesIO) as UTF-8 text, BOM stripped"""
+    if hasattr(csv_source, 'read'):
+        csv_source.seek(0)
+        text = io.TextIOWrapper(csv_source, encoding='utf-8-sig')
+        try:
+            yield text
+        finally:
+            text.detach()  # Leave the caller's buffer open
+    else:
+        with open(csv_source, 'r', encoding='utf-8-sig', buffering=CSV_READ_BUFFER_SIZE) as file:
+            yield file
+
+def _read_dictionary_rows(csv_source):
+    """Read (term, pronunciation, type, definition) tuples, skipping blank lines"""
+    with _open_csv_text(csv_source) as file:
+        reader = csv.reader(file)
+        # Resolve column positions from the header once instead of building a dict per row
+        header = next(reader, [])
+        get_fields = operator.itemgetter(*(header.index(column) for column in ('term', 'pronunciation', 'type', 'definition')))
+        return [get_fields(row) for row in reader if row]
+
+def _read_quote_rows(csv_source):
+    """Read one quote per non-empty line"""
+    with _open_csv_text(csv_source) as file:
+        return [quote for quote in (line.strip() for line in file) if quote]
+
+def _read_authored_quote_rows(csv_source):
+    """Read (quote, author) pairs, skipping malformed rows and empty quotes"""
+    with _open_csv_text(csv_source) as file:
+        return [(row[0].strip(), row[1].strip()) for row in csv.reader(file)
+                if len(row) >= 2 and row[0].strip()]
+
+def _read_document_rows(document_type, csv_source):
+    """Read a CSV with the row reader for the given document type"""
+    if document_type == "Dictionary":
+        return _read_dictionary_rows(csv_source)
+    elif document_type == "Authored Quotes":
+        return _read_authored_quote_rows(csv_source)
+    else:  # Regular Quotes mode
+        return _read_quote_rows(csv_source)
+
+# PDF Generation Function
+def create_pdf_from_csv(csv_source, output_file, *args, **kwargs):
+    """Create a dictionary PDF from a CSV file (term,pronunciation,type,definition columns)"""
+    return create_pdf_from_rows(_read_dictionary_rows(csv_source), output_file, *args, **kwargs)
+
+def create_pdf_from_rows(rows, output_file, 
+                        term_font=None, term_size=84, term_spacing=48,
+                        pronunciation_font=None, pronunciation_size=28, pronunciation_spacing=36,
+                        definition_font=None, definition_size=28, page_color="#FFFFFF",
+                        term_color="#000000", pronunciation_color="#000000", line_color="#000000", definition_color="#000000",
+                        page_width_inches=11, page_height_inches=14, text_alignment="left", page_position="bottom-left"):
+    """Create PDF with customizable fonts and sizes"""
+    
+    def register_font_safe(font_path):
+        """Safely register a font, reusing the cached registration when available"""
+        if font_path and font_path.endswith('.ttf') and os.path.exists(font_path):
+            try:
+                # Registered once per file version, then reused across calls
+                return _get_registered_font(os.path.abspath(font_path), os.path.getmtime(font_path))
+            except Exception as e:
+                st.warning(f"Failed to register {font_path}: {e}")
+                return 'Times-Bold'
+        elif font_path in ['Times-Bold', 'Helvetica-Bold', 'Helvetica', 'Times-Roman', 'Courier', 'Courier-Bold']:
+            return font_path
+        else:
+            return 'Times-Bold'
+    
+    # Register fonts (cached, stable names)
+    title_font = register_font_safe(term_font)
+    pronunciation_font_name = register_font_safe(pronunciation_font)
+    definition_font_name = register_font_safe(definition_font)
+    
+    # Enhanced Unicode support for built-in fonts
+    unicode_font = 'Helvetica'
+    unicode_font_bold = 'Helvetica-Bold'
+    
+    if pronunciation_font_name in ['Helvetica-Bold', 'Helvetica'] or definition_font_name in ['Helvetica-Bold', 'Helvetica']:
+        unicode_font, unicode_font_bold = _unicode_fallback_fonts()
+    
+    # Update built-in font references to Unicode versions
+    if pronunciation_font_name == 'Helvetica-Bold':
+        pronunciation_font_name = unicode_font_bold
+    elif pronunciation_font_name == 'Helvetica':
+        pronunciation_font_name = unicode_font
+    
+    if definition_font_name == 'Helvetica-Bold':
+        definition_font_name = unicode_font_bold
+    elif definition_font_name == 'Helvetica':
+        definition_font_name = unicode_font
+    
+    # Page setup
+    page_width = page_width_inches * inch
+    page_height = page_height_inches * inch
+    page_size = (page_width, page_height)
+    
+    # Calculate scaling factors based on 11x14 baseline
+    baseline_width = 11.0
+    baseline_height = 14.0
+    width_scale = page_width_inches / baseline_width
+    height_scale = page_height_inches / baseline_height
+    # Use average scale for consistent proportions
+    scale_factor = (width_scale + height_scale) / 2
+    
+    # Scale all size and spacing values
+    scaled_term_size = int(term_size * scale_factor)
+    scaled_term_spacing = int(term_spacing * scale_factor)
+    scaled_pronunciation_size = int(pronunciation_size * scale_factor)
+    scaled_pronunciation_spacing = int(pronunciation_spacing * scale_factor)
+    scaled_definition_size = int(definition_size * scale_factor)
+    
+    # Scale margins proportionally
+    scaled_margin = 1.5 * scale_factor * inch
+    
+    # Content area inside the margins (shared by the frame, measurement and positioning)
+    content_width = page_width - 2*scaled_margin
+    content_area_height = page_height - 2*scaled_margin
+    
+    # Scale line width and positioning
+    scaled_line_width = int(4 * scale_factor)
+    scaled_line_length = content_width  # Match frame content width
+    scaled_definition_space_before = int(54 * scale_factor)
+    
+    # Extra leading on top of font size (used by the styles and the height calculation)
+    extra_leading = int(12 * scale_factor)  # From definition_style leading
+    pronunciation_leading = int(4 * scale_factor)  # From pronunciation_style leading
+    
+    # Extra conservative margin for bottom positioning (most problematic)
+    conservative_bottom_margin = int(20 * scale_factor)
+    
+    # Content-aware positioning functions
+    def calculate_content_height(term, pronunciation, word_type, definition, title_style, pronunciation_style, definition_style, available_width):
+        """Calculate the total height needed for all content elements.
+        
+        Returns (height, term_para, pronunciation_para, definition_para) so the
+        measured paragraphs can go straight into the story.
+        """
+        # Build paragraphs once - they are measured here and reused in the story
+        term_para = make_text_flowable(term.lower(), title_style, available_width)
+        pronunciation_text = f"{pronunciation} • ({word_type})"
+        pronunciation_para = Paragraph(pronunciation_text, pronunciation_style)
+        definition_para = Paragraph(definition, definition_style)
+        
+        # Top-positioned content starts at the margin, so its height is never used
+        if page_position == "top":
+            return 0, term_para, pronunciation_para, definition_para
+        
+        try:
+            # Measure actual heights using ReportLab's wrap method
+            # Use a reasonable max height to force proper wrapping calculation
+            max_height = 20 * inch  # Large enough to not constrain wrapping
+            
+            term_height = term_para.wrap(available_width, max_height)[1]
+            pronunciation_height = pronunciation_para.wrap(available_width, max_height)[1]
+            definition_height = definition_para.wrap(available_width, max_height)[1]
+            
+            # Add spacing between elements including all style spacing
+            total_height = (term_height + scaled_term_spacing + 
+                          pronunciation_height + scaled_pronunciation_spacing + 
+                          scaled_line_width + scaled_definition_space_before + 
+                          definition_height)
+            
+            # Font-specific adjustments - different fonts need different spacing
+            font_padding = 0
+            
+            # Check for custom TTF fonts (they often have unpredictable metrics)
+            if hasattr(title_style, 'fontName') and ('_' in str(title_style.fontName) or any(char.isdigit() for char in str(title_style.fontName)[-10:])):
+                font_padding += scaled_term_size * 0.20  # Increased from 15% to 20%
+                
+            if hasattr(pronunciation_style, 'fontName') and ('_' in str(pronunciation_style.fontName) or any(char.isdigit() for char in str(pronunciation_style.fontName)[-10:])):
+                font_padding += scaled_pronunciation_size * 0.20  # Increased from 15% to 20%
+                
+            if hasattr(definition_style, 'fontName') and ('_' in str(definition_style.fontName) or any(char.isdigit() for char in str(definition_style.fontName)[-10:])):
+                font_padding += scaled_definition_size * 0.20  # Increased from 15% to 20%
+            
+            total_height += font_padding
+            
+            # Add extra spacing that ReportLab applies (leading adjustments, etc.)
+            total_height += extra_leading + pronunciation_leading
+            
+            # wrap() already reports the real wrapped height, so no line-count guesswork
+            content_height = total_height
+            
+        except Exception as e:
+            # Fallback to a width-based estimate if measurement fails
+            st.warning(f"Height calculation failed, using estimated height: {e}")
+            try:
+                content_height = (estimate_paragraph_height(term.lower(), title_style, available_width) + scaled_term_spacing +
+                                  estimate_paragraph_height(pronunciation_text, pronunciation_style, available_width) + scaled_pronunciation_spacing +
+                                  scaled_line_width + scaled_definition_space_before +
+                                  estimate_paragraph_height(definition, definition_style, available_width))
+            except Exception:
+                content_height = 8 * scale_factor * inch  # Conservative fallback
+        
+        return content_height, term_para, pronunciation_para, definition_para
+    
+    def get_end_positioned_spacer_amount(position, content_height):
+        """Your way: content ENDS at consistent margins, not starts"""
+        if position == "top":
+            return 0  # Start at top margin, flow down (same as before)
+        elif position == "middle":
+            # Center the content block in the page
+            spacer = (content_area_height - content_height) / 2
+            return max(0, spacer)  # Prevent negative spacer if content is too large
+        elif position == "bottom":
+            # END at bottom margin - calculate where to START so it ends there
+            # Just like top starts at top margin, bottom ENDS at bottom margin
+            spacer = content_area_height - content_height
+            # Add extra conservative margin for bottom positioning (most problematic)
+            spacer = spacer - conservative_bottom_margin
+            return max(0, spacer)  # Prevent negative spacer if content is too large
+        else:
+            return 0  # fallback to top
+    
+    # Get alignment constant
+    text_align_const = TEXT_ALIGNMENTS.get(text_alignment, TA_LEFT)
+    # spacer_amount will be calculated per-row based on content
+    
+    # Convert hex colors to RGB for ReportLab
+    bg_color = _hex_to_rgb(page_color)
+    term_rgb = _hex_to_rgb(term_color)
+    pronunciation_rgb = _hex_to_rgb(pronunciation_color)
+    line_rgb = _hex_to_rgb(line_color)
+    definition_rgb = _hex_to_rgb(definition_color)
+    
+    # Create custom page template with background color
+    # Create frame for content (page margins on every side)
+    frame = Frame(scaled_margin, scaled_margin, 
+                  content_width, content_area_height,
+                  id='normal')
+    
+    # Create custom document with colored background
+    # Build into a spooled buffer and copy it out in large chunks afterwards
+    pdf_buffer = _new_pdf_buffer(output_file)
+    doc = BaseDocTemplate(pdf_buffer, pagesize=page_size)
+    
+    # Add the colored page template
+    colored_template = ColoredPageTemplate('colored', [frame], bg_color, page_width, page_height)
+    doc.addPageTemplates([colored_template])
+    
+    story = []
+    
+    # Custom styles using user-selected fonts, sizes, and colors
+    title_style, pronunciation_style, definition_style = _make_dictionary_styles(
+        text_align_const,
+        title_font, scaled_term_size, scaled_term_spacing, term_rgb,
+        pronunciation_font_name, scaled_pronunciation_size, scaled_pronunciation_spacing,
+        scaled_pronunciation_size + pronunciation_leading, pronunciation_rgb,
+        definition_font_name, scaled_definition_size, scaled_definition_space_before,
+        scaled_definition_size + extra_leading, definition_rgb
+    )
+    
+    # Shared by every page's dividing line
+    line_color_obj = Color(*line_rgb)
+    
+    # Measure at the frame's inner width (Frame pads 6pt on each side)
+    available_width = content_width - 12
+    
+    # Create pages
+    for index, fields in enumerate(rows):
+        if index:
+            story.append(PageBreak())
+        
+        # Calculate basic content height (simple measurement, no complex safety margins)
+        content_height, title, pronunciation, definition = calculate_content_height(
+            *fields, title_style, pronunciation_style, definition_style, available_width)
+        
+        # Your way: content ENDS at consistent margins
+        spacer_amount = get_end_positioned_spacer_amount(page_position, content_height)
+        
+        # Offset the frame for positioning (from top)
+        story.append(FrameOffset(spacer_amount))
+        
+        # Title (lowercase)
+        story.append(title)
+        
+        # Pronunciation with type
+        story.append(pronunciation)
+        
+        # Horizontal line (scaled)
+        story.append(LineFlowable(scaled_line_length, line_color_obj, line_width=scaled_line_width))
+        
+        # Definition
+        story.append(definition)
+    
+    doc.build(story)
+    _save_pdf_buffer(pdf_buffer, output_file)
+    return True
+
+# Quote Generation Function
+def create_quotes_pdf_from_csv(csv_source, output_file, *args, **kwargs):
+    """Create a quotes PDF from a CSV file (one quote per line)"""
+    return create_quotes_pdf_from_rows(_read_quote_rows(csv_source), output_file, *args, **kwargs)
+
+def create_quotes_pdf_from_rows(rows, output_file, 
+                              quote_font=None, quote_size=48, 
+                              page_color="#FFFFFF", quote_color="#000000",
+                              page_width_inches=11, page_height_inches=14, text_alignment="center", page_position="middle"):
+    """Create PDF with one quote per page"""
+    
+    def register_font_safe(font_path):
+        """Safely register a font, reusing the cached registration when available"""
+        if font_path and font_path.endswith('.ttf') and os.path.exists(font_path):
+            try:
+                # Registered once per file version, then reused across calls
+                return _get_registered_font(os.path.abspath(font_path), os.path.getmtime(font_path))
+            except Exception as e:
+                st.warning(f"Failed to register {font_path}: {e}")
+                return 'Times-Bold'
+        elif font_path in ['Times-Bold', 'Helvetica-Bold', 'Helvetica', 'Times-Roman', 'Courier', 'Courier-Bold']:
+            return font_path
+        else:
+            return 'Times-Bold'
+    
+    # Register font with Unicode support (same as dictionary mode)
+    quote_font_name = register_font_safe(quote_font)
+    
+    # Enhanced Unicode support for built-in fonts (same as dictionary mode)
+    unicode_font = 'Helvetica'
+    unicode_font_bold = 'Helvetica-Bold'
+    
+    if quote_font_name in ['Helvetica-Bold', 'Helvetica']:
+        unicode_font, unicode_font_bold = _unicode_fallback_fonts()
+    
+    # Update built-in font references to Unicode versions
+    if quote_font_name == 'Helvetica-Bold':
+        quote_font_name = unicode_font_bold
+    elif quote_font_name == 'Helvetica':
+        quote_font_name = unicode_font
+    
+    # Page setup
+    page_width = page_width_inches * inch
+    page_height = page_height_inches * inch
+    page_size = (page_width, page_height)
+    
+    # Calculate scaling factors
+    baseline_width = 11.0
+    baseline_height = 14.0
+    width_scale = page_width_inches / baseline_width
+    height_scale = page_height_inches / baseline_height
+    scale_factor = (width_scale + height_scale) / 2
+    
+    # Scale font size and margins
+    scaled_quote_size = int(quote_size * scale_factor)
+    scaled_margin = 1.5 * scale_factor * inch  # Same margins as dictionary
+    
+    # Content area inside the margins (shared by the frame, measurement and positioning)
+    content_width = page_width - 2*scaled_margin
+    content_area_height = page_height - 2*scaled_margin
+    
+    # Extra leading on top of font size (used by the style and the height calculation)
+    extra_leading = int(12 * scale_factor)  # From quote_style leading
+    
+    # Extra conservative margin for bottom positioning (most problematic)
+    conservative_bottom_margin = int(20 * scale_factor)
+    
+    # Get alignment constant
+    text_align_const = TEXT_ALIGNMENTS.get(text_alignment, TA_CENTER)  # Default center for quotes
+    
+    # Robust content height calculation (same logic as dictionary mode)
+    def calculate_quote_height(quote_text, quote_style, available_width):
+        """Calculate the total height needed for quote content.
+        
+        Returns (height, quote_para) so the measured paragraph can be reused.
+        """
+        # Build the paragraph once - it is measured here and reused in the story
+        quote_para = Paragraph(quote_text, quote_style)
+        
+        # Top-positioned content starts at the margin, so its height is never used
+        if page_position == "top":
+            return 0, quote_para
+        
+        try:
+            # Measure actual height using ReportLab's wrap method
+            # Use a reasonable max height to force proper wrapping calculation
+            max_height = 20 * inch  # Large enough to not constrain wrapping
+            
+            quote_height = quote_para.wrap(available_width, max_height)[1]
+            
+            # Font-specific adjustments - different fonts need different spacing
+            font_padding = 0
+            
+            # Check for custom TTF fonts (they often have unpredictable metrics)
+            if hasattr(quote_style, 'fontName') and ('_' in str(quote_style.fontName) or any(char.isdigit() for char in str(quote_style.fontName)[-10:])):
+                font_padding += scaled_quote_size * 0.20  # Increased from 15% to 20%
+            
+            quote_height += font_padding
+            
+            # Add extra spacing that ReportLab applies (leading adjustments, etc.)
+            quote_height += extra_leading
+            
+            # wrap() already reports the real wrapped height, so no line-count guesswork
+            content_height = quote_height
+            
+        except Exception as e:
+            # Fallback to a width-based estimate if measurement fails
+            st.warning(f"Quote height calculation failed, using estimated height: {e}")
+            try:
+                content_height = estimate_paragraph_height(quote_text, quote_style, available_width)
+            except Exception:
+                content_height = 8 * scale_factor * inch  # Conservative fallback
+        
+        return content_height, quote_para
+    
+    # Exact same positioning approach as dictionary mode (your way: content ENDS at consistent margins)
+    def get_quote_spacer_amount(position, content_height):
+        """Your way: content ENDS at consistent margins, not starts"""
+        if position == "top":
+            return 0  # Start at top margin, flow down (same as before)
+        elif position == "middle":
+            # Center the content block in the page
+            spacer = (content_area_height - content_height) / 2
+            return max(0, spacer)  # Prevent negative spacer if content is too large
+        elif position == "bottom":
+            # END at bottom margin - calculate where to START so it ends there
+            # Just like top starts at top margin, bottom ENDS at bottom margin
+            spacer = content_area_height - content_height
+            # Add extra conservative margin for bottom positioning (most problematic)
+            spacer = spacer - conservative_bottom_margin
+            return max(0, spacer)  # Prevent negative spacer if content is too large
+        else:
+            return 0  # fallback to top
+    
+    # Convert colors
+    bg_color = _hex_to_rgb(page_color)
+    quote_rgb = _hex_to_rgb(quote_color)
+    
+    # Create document with colored background
+    frame = Frame(scaled_margin, scaled_margin, 
+                  content_width, content_area_height,
+                  id='normal')
+    
+    # Build into a spooled buffer and copy it out in large chunks afterwards
+    pdf_buffer = _new_pdf_buffer(output_file)
+    doc = BaseDocTemplate(pdf_buffer, pagesize=page_size)
+    colored_template = ColoredPageTemplate('colored', [frame], bg_color, page_width, page_height)
+    doc.addPageTemplates([colored_template])
+    
+    story = []
+    
+    # Quote style with proper leading calculation (same as dictionary mode)
+    quote_style = _make_quote_style(text_align_const, quote_font_name, scaled_quote_size,
+                                    scaled_quote_size + extra_leading, quote_rgb)
+    
+    # Measure at the frame's inner width (Frame pads 6pt on each side)
+    available_width = content_width - 12
+    
+    for index, quote_text in enumerate(rows):
+        if index:
+            story.append(PageBreak())
+        
+        # Calculate content height for this quote
+        content_height, quote_paragraph = calculate_quote_height(quote_text, quote_style, available_width)
+        
+        # Calculate positioning spacer
+        spacer_amount = get_quote_spacer_amount(page_position, content_height)
+        
+        # Offset the frame for positioning
+        story.append(FrameOffset(spacer_amount))
+        
+        # Add quote without quotation marks
+        story.append(quote_paragraph)
+    
+    doc.build(story)
+    _save_pdf_buffer(pdf_buffer, output_file)
+    return True
+
+# Authored Quote Generation Function
+def _measure_paragraph_height(text, font_name, font_size, leading, available_width):
+    """Wrapped paragraph height for text in the given font, size and leading"""
+    # Plain text is wrapped directly from glyph widths, skipping Paragraph's parser
+    line_count = _wrapped_line_count(text, font_name, font_size, available_width)
+    if line_count is not None:
+        return line_count * leading
+    style = ParagraphStyle('Measure', fontName=font_name, fontSize=font_size, leading=leading)
+    max_height = 20 * inch  # Large enough to not constrain wrapping
+    return Paragraph(text, style).wrap(available_width, max_height)[1]
+
+def create_authored_quotes_pdf_from_csv(csv_source, output_file, *args, **kwargs):
+    """Create an authored quotes PDF from a CSV file (quote,author format)"""
+    return create_authored_quotes_pdf_from_rows(_read_authored_quote_rows(csv_source), output_file, *args, **kwargs)
+
+def create_authored_quotes_pdf_from_rows(rows, output_file, 
+                                       quote_font=None, quote_size=48, 
+                                       author_font=None, author_size=24,
+                                       page_color="#FFFFFF", quote_color="#000000", author_color="#000000",
+                                       page_width_inches=11, page_height_inches=14, text_alignment="left", page_position="bottom"):
+    """Create PDF with one (quote, author) pair per page"""
+    
+    def register_font_safe(font_path):
+        """Safely register a font, reusing the cached registration when available"""
+        if font_path and font_path.endswith('.ttf') and os.path.exists(font_path):
+            try:
+                # Registered once per file version, then reused across calls
+                return _get_registered_font(os.path.abspath(font_path), os.path.getmtime(font_path))
+            except Exception as e:
+                st.warning(f"Failed to register {font_path}: {e}")
+                return 'Times-Bold'
+        elif font_path in ['Times-Bold', 'Helvetica-Bold', 'Helvetica', 'Times-Roman', 'Courier', 'Courier-Bold']:
+            return font_path
+        else:
+            return 'Times-Bold'
+    
+    # Register fonts with Unicode support (same as dictionary mode)
+    quote_font_name = register_font_safe(quote_font)
+    author_font_name = register_font_safe(author_font)
+    
+    # Enhanced Unicode support for built-in fonts (same as dictionary mode)
+    unicode_font = 'Helvetica'
+    unicode_font_bold = 'Helvetica-Bold'
+    
+    if quote_font_name in ['Helvetica-Bold', 'Helvetica'] or author_font_name in ['Helvetica-Bold', 'Helvetica']:
+        unicode_font, unicode_font_bold = _unicode_fallback_fonts()
+    
+    # Update built-in font references to Unicode versions
+    if quote_font_name == 'Helvetica-Bold':
+        quote_font_name = unicode_font_bold
+    elif quote_font_name == 'Helvetica':
+        quote_font_name = unicode_font
+        
+    if author_font_name == 'Helvetica-Bold':
+        author_font_name = unicode_font_bold
+    elif author_font_name == 'Helvetica':
+        author_font_name = unicode_font
+    
+    # Page setup
+    page_width = page_width_inches * inch
+    page_height = page_height_inches * inch
+    page_size = (page_width, page_height)
+    
+    # Calculate scaling factors
+    baseline_width = 11.0
+    baseline_height = 14.0
+    width_scale = page_width_inches / baseline_width
+    height_scale = page_height_inches / baseline_height
+    scale_factor = (width_scale + height_scale) / 2
+    
+    # Scale font sizes and margins
+    scaled_quote_size = int(quote_size * scale_factor)
+    scaled_author_size = int(author_size * scale_factor)
+    scaled_margin = 1.5 * scale_factor * inch
+    scaled_author_spacing = int(24 * scale_factor)  # Space between quote and author
+    content_area_height = page_height - 2 * scaled_margin
+    
+    # Scale-dependent paddings, computed once instead of per row
+    extra_leading = int(12 * scale_factor)  # From quote_style leading
+    author_leading = int(4 * scale_factor)  # From author_style leading
+    conservative_bottom_margin = int(20 * scale_factor)
+    
+    # Height padding stays in floats; the total is rounded once per row
+    multiline_unit = 8 * scale_factor
+    unicode_padding = 6 * scale_factor
+    
+    # Custom TTF fonts often have unpredictable metrics; the fonts are fixed per document
+    font_padding = 0
+    if _is_custom_font(quote_font_name):
+        font_padding += scaled_quote_size * 0.20  # 20% extra for custom fonts
+    if _is_custom_font(author_font_name):
+        font_padding += scaled_author_size * 0.20
+    
+    # Author spacing, font padding and the extra spacing ReportLab applies
+    # (leading adjustments, etc.) are the same for every row
+    fixed_padding = scaled_author_spacing + font_padding + (12 + 4) * scale_factor
+    
+    # Get alignment constant
+    text_align_const = TEXT_ALIGNMENTS.get(text_alignment, TA_LEFT)  # Default left for authored quotes
+    
+    # Robust content height calculation (same logic as dictionary mode)
+    def measure_unique_heights(texts, style, available_width):
+        """Measure each distinct text once with ReportLab's wrap method"""
+        heights = {}
+        for text in texts:
+            try:
+                heights[text] = _measure_paragraph_height(text, style.fontName, style.fontSize,
+                                                          style.leading, available_width)
+            except Exception as e:
+                st.warning(f"Failed to measure {text[:40]!r}: {e}")
+        return heights
+    
+    def calculate_authored_quote_height(quote_text, author_text, quote_style, author_style):
+        """Calculate the total height needed for quote + author content with proper safety margins"""
+        # Top-positioned content starts at the margin, so its height is never used
+        if page_position == "top":
+            return 0
+        
+        try:
+            # Heights were measured once per distinct quote and author before the build loop
+            quote_height = quote_heights[quote_text]
+            author_height = author_heights[author_text]
+            
+            # Add spacing, font padding and leading adjustments
+            total_height = quote_height + author_height + fixed_padding
+            
+            # ReportLab can add unexpected spacing for long text blocks
+            # Add extra padding for multi-line content (the sneaky overflow culprit)
+            quote_line_count = max(1, len(quote_text) // chars_per_line)  # Rough estimate of lines
+            if quote_line_count > 2:  # Multi-line quotes need extra space
+                total_height += quote_line_count * multiline_unit
+            
+            # Character-specific adjustments for special characters that can affect height
+            if not (quote_text.isascii() and author_text.isascii()):  # Non-ASCII characters
+                total_height += unicode_padding
+            
+            # Increased safety margin from 5% to 10% to catch edge cases
+            safety_margin = total_height * 0.10
+                
+            return round(total_height + safety_margin)
+            
+        except Exception as e:
+            # Fallback to conservative estimate if measurement fails
+            st.warning(f"Authored quote height calculation failed, using conservative estimate: {e}")
+            return 8 * scale_factor * inch  # Conservative fallback
+    
+    # Exact same positioning approach as dictionary mode (your way: content ENDS at consistent margins)
+    def get_authored_quote_spacer_amount(position, content_height):
+        """Your way: content ENDS at consistent margins, not starts"""
+        if position == "top":
+            return 0  # Start at top margin, flow down (same as before)
+        elif position == "middle":
+            # Center the content block in the page
+            spacer = (content_area_height - content_height) / 2
+            return max(0, spacer)  # Prevent negative spacer if content is too large
+        elif position == "bottom":
+            # END at bottom margin - calculate where to START so it ends there
+            # Just like top starts at top margin, bottom ENDS at bottom margin
+            spacer = content_area_height - content_height
+            # Add extra conservative margin for bottom positioning (most problematic)
+            spacer = spacer - conservative_bottom_margin
+            return max(0, spacer)  # Prevent negative spacer if content is too large
+        else:
+            return 0  # fallback to top
+    
+    # Convert colors
+    bg_color = _hex_to_rgb(page_color)
+    quote_rgb = _hex_to_rgb(quote_color)
+    author_rgb = _hex_to_rgb(author_color)
+    
+    # Create document with colored background
+    frame = Frame(scaled_margin, scaled_margin, 
+                  page_width - 2*scaled_margin, content_area_height,
+                  id='normal')
+    
+    # Build into a spooled buffer and copy it out in large chunks afterwards
+    pdf_buffer = _new_pdf_buffer(output_file)
+    doc = BaseDocTemplate(pdf_buffer, pagesize=page_size)
+    colored_template = ColoredPageTemplate('colored', [frame], bg_color, page_width, page_height)
+    doc.addPageTemplates([colored_template])
+    
+    story = []
+    
+    # Quote and author styles with proper leading calculation (same as dictionary mode)
+    quote_style, author_style = _make_authored_quote_styles(
+        text_align_const,
+        quote_font_name, scaled_quote_size, scaled_quote_size + extra_leading, quote_rgb,
+        author_font_name, scaled_author_size, scaled_author_size + author_leading, author_rgb
+    )
+    
+    available_width = page_width - 2 * scaled_margin
+    # Lines hold about available_width / (half an em) characters at the quote size
+    chars_per_line = max(1, int(available_width / (scaled_quote_size * 0.5)))
+    
+    # Authors repeat across many rows, so measure each distinct text only once
+    quote_heights = {}
+    author_heights = {}
+    if page_position != "top":
+        quote_heights = measure_unique_heights({quote for quote, _ in rows}, quote_style, available_width)
+        author_heights = measure_unique_heights({author for _, author in rows}, author_style, available_width)
+    
+    for index, (quote_text, author_text) in enumerate(rows):
+        if index:
+            story.append(PageBreak())
+        
+        # Calculate content height for this quote + author
+        content_height = calculate_authored_quote_height(quote_text, author_text, quote_style, author_style)
+        
+        # Calculate positioning spacer
+        spacer_amount = get_authored_quote_spacer_amount(page_position, content_height)
+        
+        # Offset the frame for positioning
+        story.append(FrameOffset(spacer_amount))
+        
+        # Add quote without quotation marks
+        quote_paragraph = Paragraph(quote_text, quote_style)
+        story.append(quote_paragraph)
+        
+        # Add spacing between quote and author
+        story.append(Spacer(1, scaled_author_spacing))
+        
+        # Add author attribution
+        author_paragraph = Paragraph(author_text, author_style)
+        story.append(author_paragraph)
+    
+    doc.build(story)
+    _save_pdf_buffer(pdf_buffer, output_file)
+    return True
+
+# Pool worker start-up
+def _init_worker():
+    """Pool initializer: register the Unicode fallback fonts before the first task
+    
+    Registrations are cached for the worker's lifetime, so each worker parses the
+    fallbacks and each selected font once, however many sizes and presses it serves.
+    """
+    _unicode_fallback_fonts()
+
+# PNG rendering
+def _render_png_page(pdf_document, page_num, matrix):
+    """Render one page and return its (page_NNN.png, PNG bytes) pair"""
+    # Opaque RGB: pages always have a solid background, so an alpha channel is wasted memory
+    pixmap = pdf_document[page_num].get_pixmap(matrix=matrix, colorspace=fitz.csRGB, alpha=False)
+    return f"page_{page_num + 1:03d}.png", pixmap.tobytes(output="png")
+
+def _render_png_pages(task):
+    """Worker entry point: render a run of pages from the worker's own document handle"""
+    pdf_path, page_numbers, dpi = task
+    matrix = fitz.Matrix(dpi / 72.0, dpi / 72.0)
+    with fitz.open(pdf_path) as pdf_document:
+        return [_render_png_page(pdf_document, page_num, matrix) for page_num in page_numbers]
+
+# One document PDF to build: source rows, destination (None for in-memory bytes),
+# page size in inches, and the styling settings
+DocumentTask = collections.namedtuple('DocumentTask', [
+    'document_type', 'rows', 'output_file', 'width', 'height',
+    'term_font', 'term_size', 'term_spacing',
+    'pronunciation_font', 'pronunciation_size', 'pronunciation_spacing',
+    'definition_font', 'definition_size', 'page_color',
+    'term_color', 'pronunciation_color', 'line_color', 'definition_color',
+    'text_alignment', 'page_position',
+])
+
+def _create_document_pdf(task):
+    """Worker entry point: build one document PDF at the given page size
+    
+    With output_file None the PDF is built in memory and its bytes are returned
+    (None on failure), so results can cross the process boundary.
+    """
+    destination = io.BytesIO() if task.output_file is None else task.output_file
+    
+    # Generate PDF based on document type
+    if task.document_type == "Dictionary":
+        success = create_pdf_from_rows(
+            task.rows, destination,
+            task.term_font, task.term_size, task.term_spacing,
+            task.pronunciation_font, task.pronunciation_size, task.pronunciation_spacing,
+            task.definition_font, task.definition_size, task.page_color,
+            task.term_color, task.pronunciation_color, task.line_color, task.definition_color,
+            task.width, task.height, task.text_alignment, task.page_position
+        )
+    elif task.document_type == "Authored Quotes":
+        success = create_authored_quotes_pdf_from_rows(
+            task.rows, destination,
+            task.term_font, task.term_size,
+            task.pronunciation_font, task.pronunciation_size,
+            task.page_color, task.term_color, task.pronunciation_color,
+            task.width, task.height, task.text_alignment, task.page_position
+        )
+    else:  # Regular Quotes mode
+        success = create_quotes_pdf_from_rows(
+            task.rows, destination,
+            task.term_font, task.term_size,
+            task.page_color, task.term_color,
+            task.width, task.height, task.text_alignment, task.page_position
+        )
+    
+    if task.output_file is None:
+        return destination.getvalue() if success else None
+    return success